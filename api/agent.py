@@ -1,3 +1,4 @@
+import asyncio
 from typing import Optional, AsyncGenerator
 from rag.agent_core import get_agent, run_agent, run_agent_stream, clear_agent_session
 from rag.agent_tools import get_last_sources, clear_last_sources
@@ -7,7 +8,7 @@ async def chat(message: str, session_id: Optional[str] = None) -> tuple[str, str
     """
     Chat with the agent and return response with sources
     """
-    # Clear previous sources before new query
+    # Bind a fresh per-request source collector
     clear_last_sources()
     
     # Run agent with memory support
@@ -18,18 +19,74 @@ async def chat(message: str, session_id: Optional[str] = None) -> tuple[str, str
     
     return response, session_id, sources
 
-async def chat_stream(message: str, session_id: Optional[str] = None) -> AsyncGenerator[tuple[str, str], None]:
+async def chat_stream(
+    message: str,
+    session_id: Optional[str] = None,
+    approval: Optional["asyncio.Future[bool]"] = None,
+) -> AsyncGenerator[tuple[str, str], None]:
     """
     Chat with the agent using streaming
     """
-    # Clear previous sources before new query
+    # Bind a fresh per-request source collector
     clear_last_sources()
     
     # Run agent with streaming
-    async for token, sid in run_agent_stream(message, session_id):
+    async for token, sid in run_agent_stream(message, session_id, approval):
         yield token, sid
 
 
+class SpeculativeChatStream:
+    """
+    Start chat_stream immediately and buffer its tokens until released.
+    Used to overlap the agent run with the LLM safety classification.
+    The turn is only persisted after release(), even if the run finishes
+    first; cancel() aborts the run and the agent restores the session memory.
+    """
+    _DONE = object()
+    
+    def __init__(self, message: str, session_id: Optional[str] = None):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.sources: list[dict] = []
+        self._approval: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._pump(message, session_id))
+    
+    async def _pump(self, message: str, session_id: Optional[str]):
+        # Runs in its own task context, so sources are collected here
+        try:
+            async for token, sid in chat_stream(message, session_id, self._approval):
+                self._queue.put_nowait((token, sid))
+            self.sources = get_last_sources()
+        except Exception as e:
+            self._queue.put_nowait(e)
+        finally:
+            self._queue.put_nowait(self._DONE)
+    
+    async def stream(self) -> AsyncGenerator[tuple[str, str], None]:
+        """Yield buffered tokens, then the rest of the run as it arrives."""
+        while True:
+            item = await self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
+    def release(self):
+        """The message is safe: let the run persist its turn."""
+        if not self._approval.done():
+            self._approval.set_result(True)
+    
+    async def cancel(self):
+        """Abort the run (or roll back its finished turn); buffered tokens are discarded."""
+        if not self._approval.done():
+            self._approval.set_result(False)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
 async def new_session() -> str:
     """
     Create a new chat session
@@ -42,4 +99,4 @@ async def end_session(session_id: str) -> bool:
     """
     End and clear a chat session
     """
-    return clear_agent_session(session_id)
+    return await clear_agent_session(session_id)
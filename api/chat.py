@@ -3,10 +3,12 @@ import json
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from api.agent import chat_stream, new_session, end_session
-from rag.agent_tools import get_last_sources
-from rag.safety import safety_check
-from rag.global_settings import init_llm_settings
+from rag.global_settings import init_llm_settings, llm_client_stats, SPECULATIVE_AGENT_RUN
+
+# The agent, retriever and safety modules pull in LlamaIndex, chromadb and
+# torch, so they are imported inside the handlers: the app (and the
+# /assessment endpoints) start without them, and the warm-up thread has
+# usually imported them before the first chat arrives.
 
 router = APIRouter()
 
@@ -21,77 +23,129 @@ class SessionResponse(BaseModel):
 @router.post("/session/new", response_model=SessionResponse)
 async def create_session():
     """Create a new chat session."""
+    from api.agent import new_session
     session_id = await new_session()
     return SessionResponse(session_id=session_id, success=True)
 
 @router.delete("/session/{session_id}", response_model=SessionResponse)
 async def delete_session(session_id: str):
     """End and clear a chat session."""
+    from api.agent import end_session
     success = await end_session(session_id)
     return SessionResponse(session_id=session_id, success=success)
 
+@router.get("/session/stats")
+async def get_session_stats():
+    """Size and memory estimate of the in-process session store."""
+    from rag.memory import session_stats
+    return session_stats()
+
+@router.get("/llm/stats")
+async def get_llm_stats():
+    """LLM client construction cost and HTTP connection reuse."""
+    return llm_client_stats()
+
+@router.get("/retrieval/stats")
+async def get_retrieval_stats():
+    """Per-stage latency of hybrid retrieval (embed, vector, bm25, fusion, rerank)."""
+    from rag.hybrid_retriever import retrieval_stats
+    return retrieval_stats()
+
+@router.get("/retrieval/embedding-cache/stats")
+async def get_embedding_cache_stats():
+    """Hit rate of the query embedding cache."""
+    from rag.index_builder import query_embedding_stats
+    return query_embedding_stats()
+
+@router.get("/safety/cache/stats")
+async def safety_cache_stats():
+    """Hit/miss counters of the LLM safety verdict cache."""
+    from rag.safety import verdict_cache_stats
+    return verdict_cache_stats()
+
 
 @router.post("/chat")
 async def chat_stream_endpoint(req: ChatRequest):
     """
     Streaming chat endpoint using Server-Sent Events (SSE)
     """
+    from api.agent import chat_stream, SpeculativeChatStream
+    from rag.agent_tools import get_last_sources
+    from rag.safety import safety_check_async
+    
     user_msg = req.message
     session_id = req.session_id
     
     init_llm_settings()
 
-    # Safety check
-    safety = safety_check(user_msg)
-    level = safety["level"]
-    print("SAFETY CHECK:", safety)
-
     async def generate():
         nonlocal session_id
         
-        # Send safety status first
-        yield f"data: {json.dumps({'type': 'safety', 'data': safety})}\n\n"
+        # Optionally start the agent now; its tokens are held until the verdict
+        speculative = SpeculativeChatStream(user_msg, session_id) if SPECULATIVE_AGENT_RUN else None
         
-        # Crisis case - don't stream, send full message
-        if level == "crisis":
-            crisis_msg = (
-                "⚠️ Mình rất tiếc khi nghe điều đó. An toàn của bạn lúc này là quan trọng nhất.\n\n"
-                "👉 Bạn có thể gọi ngay **1900 1267 (phím 1)** — đường dây hỗ trợ khủng hoảng tâm lý và trầm cảm, trực 24/7.\n\n"
-                "👉 Nếu bạn muốn một lựa chọn khác, bạn có thể gọi **096 306 1414** – đường dây 'Ngày Mai'.\n\n"
-                "Nếu bạn cảm thấy mình đang gặp nguy hiểm ngay lúc này, hãy gọi **115** hoặc đến cơ sở y tế gần nhất.\n\n"
-                "Bạn không đơn độc — hãy tìm sự hỗ trợ ngay lúc này."
-            )
-            yield f"data: {json.dumps({'type': 'crisis', 'data': crisis_msg})}\n\n"
-            yield f"data: {json.dumps({'type': 'done', 'session_id': session_id})}\n\n"
-            return
-        
-        # Warning case - send warning first
-        if level == "warning":
-            warning_msg = (
-                "⚠️ Mình cảm nhận được là bạn đang trải qua một giai đoạn khó khăn. "
-                "Cảm xúc như vậy hoàn toàn có thật và đáng để lắng nghe. Mình sẽ luôn ở đây để hỗ trợ bạn trong khả năng của mình.\n\n"
-                "Nếu những cảm xúc này kéo dài hoặc trở nên nặng nề hơn, "
-                "bạn có thể cân nhắc chia sẻ với một chuyên gia tâm lý hoặc người thân mà bạn tin tưởng. "
-                "Bạn không cần phải tự mình vượt qua tất cả đâu."
-            )
-            yield f"data: {json.dumps({'type': 'warning', 'data': warning_msg})}\n\n"
-        
-        # Stream the response
         try:
-            async for token, sid in chat_stream(user_msg, session_id):
-                session_id = sid  # Update session_id
-                if token:
-                    yield f"data: {json.dumps({'type': 'token', 'data': token})}\n\n"
+            # Safety check (awaited inside the stream so the event loop stays free)
+            safety = await safety_check_async(user_msg)
+            level = safety["level"]
+            print("SAFETY CHECK:", safety)
             
-            # Send sources at the end
-            sources = get_last_sources()
-            yield f"data: {json.dumps({'type': 'sources', 'data': sources})}\n\n"
+            # Send safety status first
+            yield f"data: {json.dumps({'type': 'safety', 'data': safety})}\n\n"
             
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
-        
-        # Signal completion
-        yield f"data: {json.dumps({'type': 'done', 'session_id': session_id})}\n\n"
+            # Crisis case - don't stream, send full message
+            if level == "crisis":
+                if speculative:
+                    await speculative.cancel()
+                
+                crisis_msg = (
+                    "⚠️ Mình rất tiếc khi nghe điều đó. An toàn của bạn lúc này là quan trọng nhất.\n\n"
+                    "👉 Bạn có thể gọi ngay **1900 1267 (phím 1)** — đường dây hỗ trợ khủng hoảng tâm lý và trầm cảm, trực 24/7.\n\n"
+                    "👉 Nếu bạn muốn một lựa chọn khác, bạn có thể gọi **096 306 1414** – đường dây 'Ngày Mai'.\n\n"
+                    "Nếu bạn cảm thấy mình đang gặp nguy hiểm ngay lúc này, hãy gọi **115** hoặc đến cơ sở y tế gần nhất.\n\n"
+                    "Bạn không đơn độc — hãy tìm sự hỗ trợ ngay lúc này."
+                )
+                yield f"data: {json.dumps({'type': 'crisis', 'data': crisis_msg})}\n\n"
+                yield f"data: {json.dumps({'type': 'done', 'session_id': session_id})}\n\n"
+                return
+            
+            # Not a crisis: the speculative run may now persist its turn
+            if speculative:
+                speculative.release()
+            
+            # Warning case - send warning first
+            if level == "warning":
+                warning_msg = (
+                    "⚠️ Mình cảm nhận được là bạn đang trải qua một giai đoạn khó khăn. "
+                    "Cảm xúc như vậy hoàn toàn có thật và đáng để lắng nghe. Mình sẽ luôn ở đây để hỗ trợ bạn trong khả năng của mình.\n\n"
+                    "Nếu những cảm xúc này kéo dài hoặc trở nên nặng nề hơn, "
+                    "bạn có thể cân nhắc chia sẻ với một chuyên gia tâm lý hoặc người thân mà bạn tin tưởng. "
+                    "Bạn không cần phải tự mình vượt qua tất cả đâu."
+                )
+                yield f"data: {json.dumps({'type': 'warning', 'data': warning_msg})}\n\n"
+            
+            # Stream the response
+            try:
+                stream = speculative.stream() if speculative else chat_stream(user_msg, session_id)
+                async for token, sid in stream:
+                    session_id = sid  # Update session_id
+                    if token:
+                        yield f"data: {json.dumps({'type': 'token', 'data': token})}\n\n"
+                
+                # Send sources at the end (collected per request, not shared)
+                sources = speculative.sources if speculative else get_last_sources()
+                yield f"data: {json.dumps({'type': 'sources', 'data': sources})}\n\n"
+                
+            except Exception as e:
+                yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
+            
+            # Signal completion
+            yield f"data: {json.dumps({'type': 'done', 'session_id': session_id})}\n\n"
+        finally:
+            # Client gone (or safety check failed) before the run finished:
+            # stop it; a finished, released run is left alone
+            if speculative:
+                await speculative.cancel()
     
     return StreamingResponse(
         generate(),
@@ -1,15 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from api.chat import router as chat_router
 from api.assessments import router as assess_router
+from rag.global_settings import WARMUP_ON_STARTUP
+from rag.index_builder import close_query_embedding_cache
+from rag.warmup import start_warm_up, readiness
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load retriever, BM25, Chroma, embedding model and reranker in parallel
+    # threads; the server answers probes while they load
+    if WARMUP_ON_STARTUP:
+        start_warm_up()
+    yield
+    close_query_embedding_cache()
 
 app = FastAPI(
     title="Mental Health Assistant API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(chat_router)
 app.include_router(assess_router)
 
 @app.get("/health")
+@app.get("/health/live")
 def health_check():
+    """Liveness: the process is up and serving requests"""
     return {"status": "ok"}
+
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: every model/index is loaded (503 with per-component status otherwise)"""
+    status = readiness()
+    if not WARMUP_ON_STARTUP:
+        # Components load lazily on first use
+        status["ready"] = True
+        status["warm_up"] = "disabled"
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
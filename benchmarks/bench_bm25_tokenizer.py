@@ -0,0 +1,102 @@
+"""
+Benchmark: BM25 recall and latency, regex tokenizer vs Vietnamese analyzer.
+
+Builds one BM25 index per analyzer from the ingested nodes (data/bm25) in a
+temp directory and compares:
+- ingest-time tokenization + index build time and index size
+- query latency (p50 / p99)
+- recall@BM25_TOP_K on known-item queries: a random 3-6 syllable window of a
+  node's text must retrieve that node; measured on the original text and on
+  the same queries typed without diacritics
+- recall@BM25_TOP_K on a labeled JSONL set if `--labels` is given
+  ({"query": "...", "relevant_node_ids": ["...", ...]} per line)
+
+Usage:
+    python -m benchmarks.bench_bm25_tokenizer [--queries 300] [--labels path]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from rag.bm25_index import BM25Index, NodeStore, RegexAnalyzer, build_bm25_index, get_default_analyzer
+from rag.vi_tokenizer import VietnameseAnalyzer, fold_diacritics
+from rag.global_settings import BM25_INDEX_DIR, BM25_TOP_K
+
+def known_item_queries(store: NodeStore, n: int, seed: int = 0) -> list[tuple[str, set[str]]]:
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < n:
+        i = rng.randrange(len(store))
+        node = store.get(i)
+        syllables = node.text.split()
+        if len(syllables) < 8:
+            continue
+        size = rng.randint(3, 6)
+        start = rng.randrange(len(syllables) - size)
+        queries.append((" ".join(syllables[start:start + size]), {node.node_id}))
+    return queries
+
+def load_labels(path: str) -> list[tuple[str, set[str]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [(r["query"], set(r["relevant_node_ids"])) for r in records]
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def evaluate(index: BM25Index, store: NodeStore, queries: list[tuple[str, set[str]]]) -> tuple[float, list[float]]:
+    node_ids = list(store.index_of)
+    hits, latencies = [], []
+    for query, relevant in queries:
+        start = time.perf_counter()
+        results = index.search(query, BM25_TOP_K)
+        latencies.append((time.perf_counter() - start) * 1000)
+        retrieved = {node_ids[i] for i, _ in results}
+        hits.append(len(retrieved & relevant) / min(len(relevant), BM25_TOP_K))
+    return statistics.mean(hits), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--labels", default=None)
+    args = parser.parse_args()
+
+    store = NodeStore(BM25_INDEX_DIR)
+    nodes = [store.get(i) for i in range(len(store))]
+    print(f"{len(nodes)} nodes from {BM25_INDEX_DIR}, recall@{BM25_TOP_K}")
+
+    query_sets = {"known-item": known_item_queries(store, args.queries)}
+    query_sets["known-item (no accents)"] = [(fold_diacritics(q), rel) for q, rel in query_sets["known-item"]]
+    if args.labels:
+        query_sets["labeled"] = load_labels(args.labels)
+        query_sets["labeled (no accents)"] = [(fold_diacritics(q), rel) for q, rel in query_sets["labeled"]]
+
+    analyzers = {
+        "regex (current)": RegexAnalyzer(),
+        "vi": VietnameseAnalyzer(fold=False),
+        "vi + folded": get_default_analyzer(),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, analyzer in analyzers.items():
+            index_dir = os.path.join(tmp, analyzer.name + str(len(analyzer.fields)))
+            start = time.perf_counter()
+            meta = build_bm25_index(nodes, index_dir, analyzer=analyzer)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            index = BM25Index(index_dir)
+            print(f"\n{name}: build {build_ms:.0f} ms (tokenize {meta['tokenize_ms']:.0f} ms), "
+                  f"size {dir_size(index_dir) / 1024:.0f} KB")
+            for set_name, queries in query_sets.items():
+                recall, latencies = evaluate(index, store, queries)
+                ordered = sorted(latencies)
+                p99 = ordered[max(int(len(ordered) * 0.99) - 1, 0)]
+                print(f"  {set_name:26s} | recall {recall:.3f} | "
+                      f"p50 {statistics.median(ordered):6.2f} ms | p99 {p99:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: Chroma HNSW parameters (M, ef_construction, ef_search).
+
+Loads the node embeddings of the BM25 index under BM25_INDEX_DIR (or
+random unit vectors with --synthetic), and for each parameter set builds a
+fresh persistent collection in a temporary directory with bulk upserts of
+the precomputed vectors. Queries are corpus vectors with a little noise;
+the ground truth is the exact cosine top-k computed with numpy. Prints
+build time, on-disk size, single-query latency (p50/p99) and recall@k.
+
+Parameter sets are "M:ef_construction:ef_search"; 16:100:100 is Chroma's
+default graph, the configured one is always included.
+
+Usage:
+    python -m benchmarks.bench_chroma_hnsw [--params 16:100:100 16:200:100 32:200:200] [--queries 200]
+    python -m benchmarks.bench_chroma_hnsw --synthetic 20000 --dim 768
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from rag.global_settings import (
+    BM25_INDEX_DIR,
+    CHROMA_HNSW_SPACE,
+    CHROMA_HNSW_M,
+    CHROMA_HNSW_EF_CONSTRUCTION,
+    CHROMA_HNSW_EF_SEARCH,
+    CHROMA_UPSERT_BATCH,
+)
+
+def load_vectors(synthetic: int, dim: int, seed: int) -> np.ndarray:
+    if synthetic:
+        vectors = np.random.default_rng(seed).standard_normal((synthetic, dim), dtype=np.float32)
+    else:
+        vectors = np.load(os.path.join(BM25_INDEX_DIR, "embeddings.npy")).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    queries = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    queries = queries + rng.standard_normal(queries.shape, dtype=np.float32) * noise / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> list[set[int]]:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run(vectors: np.ndarray, queries: np.ndarray, truth: list[set[int]], k: int,
+        m: int, ef_construction: int, ef_search: int) -> dict:
+    import chromadb
+
+    directory = tempfile.mkdtemp(prefix="bench_chroma_")
+    try:
+        client = chromadb.PersistentClient(path=directory)
+        collection = client.create_collection("bench_collection", configuration={"hnsw": {
+            "space": CHROMA_HNSW_SPACE,
+            "max_neighbors": m,
+            "ef_construction": ef_construction,
+            "ef_search": ef_search,
+        }})
+        ids = [str(i) for i in range(len(vectors))]
+        batch_size = min(CHROMA_UPSERT_BATCH, client.get_max_batch_size())
+
+        start = time.perf_counter()
+        for i in range(0, len(vectors), batch_size):
+            collection.upsert(ids=ids[i:i + batch_size], embeddings=vectors[i:i + batch_size])
+        build_s = time.perf_counter() - start
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=query[None, :], n_results=k, include=[])
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(expected & {int(i) for i in result["ids"][0]})
+
+        del collection, client
+        return {
+            "build_s": build_s,
+            "size_mb": dir_size(directory) / 1e6,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "recall": hits / (k * len(queries)),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def parse_params(value: str) -> tuple[int, int, int]:
+    try:
+        m, ef_construction, ef_search = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected M:ef_construction:ef_search, got {value!r}")
+    return m, ef_construction, ef_search
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--params", type=parse_params, nargs="+",
+                        default=[(16, 100, 100), (16, 200, 50), (16, 200, 100), (32, 200, 100), (32, 400, 200)])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.3, help="query perturbation, relative to a unit vector")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of the BM25 embeddings")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.synthetic, args.dim, args.seed)
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    truth = exact_top_k(vectors, queries, args.k)
+    print(f"{len(vectors)} vectors of dim {vectors.shape[1]}, {len(queries)} queries, "
+          f"space {CHROMA_HNSW_SPACE}, recall@{args.k} against exact search\n")
+
+    params = list(dict.fromkeys([*args.params, (CHROMA_HNSW_M, CHROMA_HNSW_EF_CONSTRUCTION, CHROMA_HNSW_EF_SEARCH)]))
+    for m, ef_construction, ef_search in params:
+        result = run(vectors, queries, truth, args.k, m, ef_construction, ef_search)
+        configured = " (configured)" if (m, ef_construction, ef_search) == (
+            CHROMA_HNSW_M, CHROMA_HNSW_EF_CONSTRUCTION, CHROMA_HNSW_EF_SEARCH) else ""
+        print(f"M {m:3d} | ef_construction {ef_construction:4d} | ef_search {ef_search:4d} | "
+              f"build {result['build_s']:6.2f} s | disk {result['size_mb']:7.1f} MB | "
+              f"query p50 {result['p50_ms']:6.2f} ms p99 {result['p99_ms']:6.2f} ms | "
+              f"recall@{args.k} {result['recall']:.4f}{configured}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: ingestion scaling with the number of worker processes.
+
+Loads the documents under DOCS_DIR (no manifest, cache, Chroma or BM25
+writes), cuts them into shards, and for each worker count runs the
+semantic splitting and node embedding through IngestExecutor. Prints
+wall time per phase (pool start-up and model loading included), nodes/s
+and speedup over the first worker count, and checks that every run
+produced the same nodes and embeddings in the same order.
+
+Usage:
+    python -m benchmarks.bench_ingest_workers [--workers 1 2 4 8] [--max-chars 300000]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from llama_index.core.schema import MetadataMode
+
+from rag.embedding_cache import TextEmbeddingMemo
+from rag.global_settings import DOCS_DIR, DOC_EXTENSIONS
+from rag.ingest_manifest import scan_documents
+from rag.ingest_pipeline import IngestExecutor, load_file, shard_documents
+
+def load_shards(max_chars: int) -> list:
+    shards, total = [], 0
+    for rel_path in scan_documents(DOCS_DIR, DOC_EXTENSIONS):
+        for shard in shard_documents(load_file(rel_path)):
+            if max_chars and total >= max_chars:
+                return shards
+            shards.append(shard)
+            total += sum(len(document.text) for document in shard)
+    return shards
+
+def run(shards: list, workers: int) -> tuple[dict, list, np.ndarray]:
+    memo = TextEmbeddingMemo()
+    start = time.perf_counter()
+    with IngestExecutor(workers, memo) as executor:
+        nodes = [node for shard_nodes in executor.split(shards) for node in shard_nodes]
+        split_s = time.perf_counter() - start
+
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embeddings = np.asarray(executor.embed(texts), dtype=np.float32)
+    total_s = time.perf_counter() - start
+
+    timings = {"split_s": split_s, "embed_s": total_s - split_s, "total_s": total_s,
+               "computed": memo.report()["total_computed"]}
+    return timings, [node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes], embeddings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--max-chars", type=int, default=0, help="only use the first N characters of the corpus")
+    args = parser.parse_args()
+
+    shards = load_shards(args.max_chars)
+    chars = sum(len(document.text) for shard in shards for document in shard)
+    print(f"{len(shards)} shards, {chars} characters from {DOCS_DIR} ({os.cpu_count()} CPUs)\n")
+
+    baseline, reference = None, None
+    for workers in args.workers:
+        timings, texts, embeddings = run(shards, workers)
+        baseline = baseline or timings["total_s"]
+
+        if reference is None:
+            reference = (texts, embeddings)
+            same = "reference"
+        else:
+            same = "same output" if texts == reference[0] and np.allclose(embeddings, reference[1], atol=1e-5) else "OUTPUT DIFFERS"
+
+        print(f"workers {workers:2d} | total {timings['total_s']:7.1f} s | split {timings['split_s']:7.1f} s | "
+              f"embed {timings['embed_s']:6.1f} s | {len(texts) / timings['total_s']:7.1f} nodes/s | "
+              f"speedup {baseline / timings['total_s']:4.2f}x | {timings['computed']} embeddings | {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark: single-pass keyword automaton vs per-pattern regex loop.
+
+Usage:
+    python -m benchmarks.bench_keyword_match [--repeat 2000]
+"""
+import argparse
+import time
+
+from rag.safety import (
+    CRISIS_PATTERNS,
+    WARNING_PATTERNS,
+    keyword_match,
+    normalize_text,
+)
+
+# Real-length chat messages (mostly safe, some warning/crisis)
+CORPUS = [
+    "Chào bạn, mình muốn hỏi về tiêu chuẩn chẩn đoán rối loạn lo âu lan tỏa theo DSM-5. "
+    "Mình đọc trên mạng thấy nhiều thông tin khác nhau nên hơi bối rối, bạn giải thích giúp mình được không?",
+    "Dạo này mình ngủ không ngon, thường thức dậy lúc 3-4 giờ sáng rồi không ngủ lại được. "
+    "Ban ngày thì uể oải, làm việc không tập trung. Như vậy có phải là mất ngủ mãn tính không?",
+    "Mình cảm thấy rất lo lắng mỗi khi phải thuyết trình trước lớp, tim đập nhanh, tay run và khó thở. "
+    "Có cách nào để kiểm soát cảm giác này không ạ?",
+    "Em năm nay 17 tuổi, gần đây em thấy chán nản mọi thứ, không muốn đi học, không muốn gặp bạn bè. "
+    "Bố mẹ thì nghĩ em lười. Em không biết phải làm sao nữa.",
+    "Cho mình hỏi sự khác nhau giữa rối loạn lưỡng cực type I và type II là gì? "
+    "Mình đang làm bài tập môn tâm lý học lâm sàng.",
+    "Mình bị stress công việc kéo dài mấy tháng nay, deadline dồn dập, sếp áp lực. "
+    "Về nhà thì mệt mỏi quá, chẳng muốn làm gì, cuối tuần chỉ nằm lì trên giường.",
+    "Hôm nay mình đi dạo công viên với gia đình, thời tiết đẹp nên tâm trạng khá tốt. "
+    "Mình muốn hỏi thêm về các bài tập thở giúp thư giãn trước khi ngủ.",
+    "Mình thấy cuộc sống không còn ý nghĩa gì nữa, mình là gánh nặng cho mọi người xung quanh. "
+    "Nhiều lúc mình chỉ muốn biến mất khỏi đây.",
+    "Tôi đã nghĩ đến cái chết rất nhiều lần trong tuần này, thậm chí còn lên kế hoạch tự tử. "
+    "Tôi không biết nói chuyện này với ai.",
+    "Mẹ mình hay nói có người theo dõi bà, bà nghe thấy tiếng nói lạ trong nhà vào ban đêm. "
+    "Gia đình mình nên đưa bà đi khám ở đâu?",
+    "PTSD là gì vậy? Những người từng trải qua chấn thương tâm lý thời thơ ấu có dễ mắc PTSD hơn không? "
+    "Triệu chứng thường xuất hiện sau bao lâu?",
+    "Cảm ơn bạn nhiều nhé, nói chuyện với bạn xong mình thấy nhẹ nhõm hơn hẳn. "
+    "Mình sẽ thử áp dụng mấy cách bạn gợi ý và đặt lịch gặp chuyên gia tâm lý.",
+]
+
+# Agreement check only: spacing variants around \s* and spaced-out letters
+EDGE_CASES = [
+    "tôi muốn tự tử", "tôi muốn tựtử", "tôi muốn tự   tử", "t ự t ử",
+    "m u ố n c h ế t", "muốnchết", "muốn  chết đi cho xong",
+    "không muốn sống nữa", "khôngmuốnsốngnữa", "tôi thấy tuyệt vọng quá",
+    "tự hại bản thân", "tự hạibản thân", "có người theo dõi tôi", "cóngười theo dõi",
+]
+
+def keyword_match_per_pattern(text: str) -> dict:
+    """Baseline: one regex search per pattern (previous implementation)."""
+    text_norm = normalize_text(text)
+
+    crisis_hits = [pat.pattern for pat in CRISIS_PATTERNS if pat.search(text_norm)]
+    warning_hits = [pat.pattern for pat in WARNING_PATTERNS if pat.search(text_norm)]
+
+    return {
+        "crisis_hits": crisis_hits,
+        "warning_hits": warning_hits,
+    }
+
+def bench(fn, repeat: int) -> float:
+    """Return mean microseconds per message."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for msg in CORPUS:
+            fn(msg)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(CORPUS)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Both implementations must agree before timing means anything
+    for msg in CORPUS + EDGE_CASES:
+        expected = keyword_match_per_pattern(msg)
+        actual = keyword_match(msg)
+        if expected != actual:
+            raise SystemExit(f"Mismatch on {msg[:60]!r}: {expected} != {actual}")
+
+    avg_len = sum(len(m) for m in CORPUS) / len(CORPUS)
+    print(f"Corpus: {len(CORPUS)} messages, avg {avg_len:.0f} chars, "
+          f"{len(CRISIS_PATTERNS) + len(WARNING_PATTERNS)} patterns")
+
+    baseline = bench(keyword_match_per_pattern, args.repeat)
+    automaton = bench(keyword_match, args.repeat)
+
+    print(f"per-pattern regex loop : {baseline:8.1f} us/message")
+    print(f"single-pass automaton  : {automaton:8.1f} us/message")
+    print(f"speedup                : {baseline / automaton:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: query embedding cache on a repeated-query workload.
+
+Draws queries from a skewed (Zipf-like) distribution over typical DSM5Query
+tool queries, with casing/spacing variants, and compares the raw
+HuggingFace model against the cached wrapper.
+
+Usage:
+    python -m benchmarks.bench_query_embedding_cache [--queries 500]
+"""
+import argparse
+import random
+import time
+
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+from rag.embedding_cache import CachedQueryEmbedding, QueryEmbeddingCache
+from rag.global_settings import EMBEDDING_MODEL_NAME
+
+BASE_QUERIES = [
+    "tiêu chuẩn chẩn đoán trầm cảm",
+    "triệu chứng rối loạn lo âu lan tỏa",
+    "rối loạn stress sau sang chấn PTSD",
+    "tiêu chuẩn chẩn đoán rối loạn lưỡng cực",
+    "triệu chứng tâm thần phân liệt",
+    "rối loạn ám ảnh cưỡng chế",
+    "rối loạn hoảng sợ",
+    "rối loạn giấc ngủ mất ngủ",
+    "rối loạn ăn uống chán ăn tâm thần",
+    "rối loạn tăng động giảm chú ý ADHD",
+    "rối loạn nhân cách ranh giới",
+    "trầm cảm sau sinh",
+    "rối loạn điều chỉnh",
+    "ý tưởng tự sát trong trầm cảm",
+    "rối loạn lo âu xã hội",
+]
+
+def variants(query: str) -> list[str]:
+    return [query, query.capitalize(), f"  {query} ", query.replace(" ", "  ")]
+
+def make_workload(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(BASE_QUERIES))]
+    picks = rng.choices(BASE_QUERIES, weights=weights, k=n)
+    return [rng.choice(variants(q)) for q in picks]
+
+def run(embed_model, workload: list[str]) -> list[float]:
+    latencies = []
+    for query in workload:
+        start = time.perf_counter()
+        embed_model.get_query_embedding(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(name: str, latencies: list[float]):
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{name:10s} | total {sum(latencies) / 1000:7.2f} s | p50 {p50:8.3f} ms | p99 {p99:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    workload = make_workload(args.queries)
+    model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL_NAME)
+    model.get_query_embedding("warm up")
+
+    report("uncached", run(model, workload))
+
+    cached = CachedQueryEmbedding(model, cache=QueryEmbeddingCache(max_size=1024))
+    report("cached", run(cached, workload))
+    print("cache stats:", cached.cache.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: cross-encoder reranking throughput and latency.
+
+Compares the previous path (SentenceTransformerRerank, one forward pass per
+request) with RerankService micro-batching on the torch, torch-int8 and
+(optionally) ONNX backends. Each request reranks FUSION_TOP_K passages;
+`--concurrency` threads issue requests at the same time, like concurrent
+chat sessions.
+
+Usage:
+    python -m benchmarks.bench_reranker [--requests 64] [--concurrency 8]
+                                        [--max-length 512] [--onnx]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from llama_index.core.postprocessor import SentenceTransformerRerank
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from rag.rerank_service import RerankService
+from rag.global_settings import RERANKER_MODEL, FUSION_TOP_K, RERANK_TOP_N
+
+QUERIES = [
+    "tiêu chuẩn chẩn đoán trầm cảm",
+    "triệu chứng rối loạn lo âu lan tỏa",
+    "rối loạn stress sau sang chấn",
+    "rối loạn lưỡng cực type II",
+]
+
+PASSAGE = (
+    "Rối loạn trầm cảm chủ yếu được đặc trưng bởi các giai đoạn kéo dài ít nhất hai tuần, "
+    "trong đó có khí sắc trầm cảm hoặc mất hứng thú, kèm theo thay đổi về giấc ngủ, ăn uống, "
+    "năng lượng, khả năng tập trung, cảm giác vô giá trị hoặc tội lỗi quá mức và ý nghĩ về cái chết. "
+)
+
+def load_candidates(from_index: bool) -> list[NodeWithScore]:
+    if from_index:
+        from rag.bm25_index import NodeStore
+        from rag.global_settings import BM25_INDEX_DIR
+        store = NodeStore(BM25_INDEX_DIR)
+        return [NodeWithScore(node=store.get(i), score=0.0) for i in range(min(FUSION_TOP_K, len(store)))]
+    return [
+        NodeWithScore(node=TextNode(text=PASSAGE * (1 + i % 4)), score=0.0)
+        for i in range(FUSION_TOP_K)
+    ]
+
+def run(rerank_fn, candidates, requests: int, concurrency: int) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            rerank_fn(QUERIES[i % len(QUERIES)], candidates)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+def report(name: str, wall: float, latencies: list[float], pairs_per_request: int):
+    ordered = sorted(latencies)
+    p99 = ordered[max(int(len(ordered) * 0.99) - 1, 0)]
+    pairs_per_sec = len(latencies) * pairs_per_request / wall
+    print(f"{name:22s} | {pairs_per_sec:8.1f} pairs/s | "
+          f"p50 {statistics.median(ordered):8.1f} ms | p99 {p99:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--onnx", action="store_true", help="Also benchmark the ONNX Runtime backend")
+    parser.add_argument("--onnx-file", default=None)
+    parser.add_argument("--from-index", action="store_true", help="Use real DSM-5 nodes from data/bm25")
+    args = parser.parse_args()
+
+    candidates = load_candidates(args.from_index)
+    pairs = len(candidates)
+    print(f"{args.requests} requests x {pairs} pairs, concurrency {args.concurrency}")
+
+    baseline = SentenceTransformerRerank(model=RERANKER_MODEL, top_n=RERANK_TOP_N, device="cpu")
+
+    def baseline_rerank(query, nodes):
+        fresh = [NodeWithScore(node=n.node, score=n.score) for n in nodes]
+        return baseline.postprocess_nodes(fresh, QueryBundle(query_str=query))
+
+    baseline_rerank(QUERIES[0], candidates)
+    report("current (per request)", *run(baseline_rerank, candidates, args.requests, args.concurrency), pairs)
+
+    backends = ["torch", "torch-int8"] + (["onnx"] if args.onnx else [])
+    for backend in backends:
+        service = RerankService(
+            model_name=RERANKER_MODEL,
+            backend=backend,
+            max_length=args.max_length,
+            onnx_file=args.onnx_file,
+        )
+        rerank = lambda query, nodes: service.rerank(query, nodes, RERANK_TOP_N)
+        rerank(QUERIES[0], candidates)
+        report(f"batched {backend}", *run(rerank, candidates, args.requests, args.concurrency), pairs)
+        print(f"{'':22s}   {service.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: per-session memory footprint and /session/new latency.
+
+"per-session agent" rebuilds a FunctionAgent + DSM5Query tool for every
+session (previous behaviour); "shared agent" only creates a Memory.
+
+Usage:
+    python -m benchmarks.bench_sessions [--sessions 10000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from api.agent import new_session
+from rag import agent_core
+from rag.memory import get_session_store, clear_all_memories
+
+async def create_sessions(n: int, per_session_agent: bool) -> tuple[list[float], int]:
+    """Create n sessions, return per-call latencies (ms) and traced bytes."""
+    latencies = []
+    agents = []  # keep per-session agents alive, as the old cache did
+
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+
+    for _ in range(n):
+        start = time.perf_counter()
+        await new_session()
+        if per_session_agent:
+            agents.append(agent_core._build_agent())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, current - base
+
+def report(name: str, latencies: list[float], traced: int, n: int):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:18s} | {traced / n / 1024:9.1f} KiB/session | "
+          f"p50 {statistics.median(latencies):7.3f} ms | p99 {p99:7.3f} ms | "
+          f"total {traced / 1024 / 1024:8.1f} MiB")
+
+async def main(n: int):
+    store = get_session_store()
+    store.max_sessions = n  # keep every session live for the measurement
+    store.stop_sweeper()
+
+    # Warm up shared objects (LLM settings, shared agent) outside the measurement
+    agent_core.get_shared_agent()
+
+    for name, per_session_agent in [("per-session agent", True), ("shared agent", False)]:
+        clear_all_memories()
+        latencies, traced = await create_sessions(n, per_session_agent)
+        report(name, latencies, traced, n)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions))
@@ -0,0 +1,101 @@
+"""
+Eval: rerank cascade latency saved vs recall@RERANK_TOP_N lost.
+
+Runs every query through hybrid_retrieve_with_rerank with and without the
+cosine cascade. With `--labels` (JSONL, one object per line:
+{"query": "...", "relevant_node_ids": ["...", ...]}) recall is measured
+against the labels; without labels the full path's top-N is the reference,
+so the number reported is the overlap with the uncascaded ranking.
+
+Thresholds can be swept without editing global_settings:
+    python -m benchmarks.eval_cascade --labels data/eval/queries.jsonl \
+        --min-similarity 0.2 0.25 0.3 --keep-margin 0.1 0.15 0.2
+"""
+import argparse
+import itertools
+import json
+import statistics
+import time
+
+import rag.hybrid_retriever as hybrid
+from rag.global_settings import RERANK_TOP_N, CASCADE_MIN_SIMILARITY, CASCADE_KEEP_MARGIN
+
+DEFAULT_QUERIES = [
+    "tiêu chuẩn chẩn đoán trầm cảm",
+    "triệu chứng rối loạn lo âu lan tỏa",
+    "rối loạn stress sau sang chấn PTSD",
+    "tiêu chuẩn chẩn đoán rối loạn lưỡng cực",
+    "triệu chứng tâm thần phân liệt",
+    "rối loạn ám ảnh cưỡng chế",
+    "rối loạn hoảng sợ",
+    "rối loạn tăng động giảm chú ý ADHD",
+    "cách nấu phở bò",
+    "giá vàng hôm nay",
+]
+
+def load_labels(path: str) -> list[tuple[str, set[str]]]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                items.append((record["query"], set(record.get("relevant_node_ids", []))))
+    return items
+
+def run(queries: list[str], cascade: bool, repeats: int) -> tuple[dict[str, list[str]], list[float]]:
+    results: dict[str, list[str]] = {}
+    latencies: list[float] = []
+    for query in queries:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            nodes = hybrid.hybrid_retrieve_with_rerank(query, RERANK_TOP_N, cascade=cascade)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[query] = [n.node.node_id for n in nodes]
+    return results, latencies
+
+def recall(results: dict[str, list[str]], reference: dict[str, set[str]]) -> float:
+    scores = []
+    for query, relevant in reference.items():
+        if relevant:
+            scores.append(len(relevant & set(results[query][:RERANK_TOP_N])) / min(len(relevant), RERANK_TOP_N))
+    return statistics.mean(scores) if scores else 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", default=None, help="Labeled JSONL query set")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-similarity", type=float, nargs="+", default=[CASCADE_MIN_SIMILARITY])
+    parser.add_argument("--keep-margin", type=float, nargs="+", default=[CASCADE_KEEP_MARGIN])
+    args = parser.parse_args()
+
+    labeled = load_labels(args.labels) if args.labels else [(q, set()) for q in DEFAULT_QUERIES]
+    queries = [q for q, _ in labeled]
+
+    # Warm up models and indexes so the first query does not skew latency
+    hybrid.hybrid_retrieve_with_rerank(queries[0], RERANK_TOP_N, cascade=False)
+
+    full, full_latencies = run(queries, cascade=False, repeats=args.repeats)
+    if args.labels:
+        reference = {q: relevant for q, relevant in labeled}
+    else:
+        reference = {q: set(ids) for q, ids in full.items()}
+
+    full_p50 = statistics.median(full_latencies)
+    print(f"{len(queries)} queries x {args.repeats} repeats, recall@{RERANK_TOP_N} "
+          f"({'labels' if args.labels else 'vs full reranking'})")
+    print(f"{'full':>22s} | p50 {full_p50:8.1f} ms | recall {recall(full, reference):.3f}")
+
+    for min_similarity, keep_margin in itertools.product(args.min_similarity, args.keep_margin):
+        hybrid.CASCADE_MIN_SIMILARITY = min_similarity
+        hybrid.CASCADE_KEEP_MARGIN = keep_margin
+        hybrid.retrieval_metrics.reset()
+
+        cascaded, latencies = run(queries, cascade=True, repeats=args.repeats)
+        p50 = statistics.median(latencies)
+        stats = hybrid.retrieval_metrics.stats()
+        print(f"min {min_similarity:.2f} / margin {keep_margin:.2f} | p50 {p50:8.1f} ms "
+              f"(saved {full_p50 - p50:6.1f} ms) | recall {recall(cascaded, reference):.3f} | "
+              f"pruned {stats['cascade_pruned_candidates']} | skipped {stats['cascade_skipped_rerank']}")
+
+if __name__ == "__main__":
+    main()
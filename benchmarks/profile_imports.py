@@ -0,0 +1,94 @@
+"""
+Profile: import time of a module (default api.main) and startup budget check.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter,
+then prints the wall time, the slowest imports by cumulative time, and the
+cumulative time per top-level package. Exits with status 1 if the import
+takes longer than `--budget-ms`, or if any module listed in `--forbid` was
+imported. CI can run it as the startup-time test.
+
+Usage:
+    python -m benchmarks.profile_imports [--module api.main] [--budget-ms 1500]
+                                         [--top 25] [--forbid chromadb torch ...]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+# Heavy dependencies that must only load on first use (retrieval, agent, ingestion)
+DEFAULT_FORBIDDEN = [
+    "chromadb",
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "llama_index.embeddings.huggingface",
+    "llama_index.vector_stores.chroma",
+    "llama_index.llms.groq",
+    "llama_index.core.agent",
+]
+
+def profile(module: str) -> tuple[float, list[tuple[int, int, int, str]]]:
+    """Return (wall ms, [(self us, cumulative us, depth, name)])"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit(f"import {module} failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return wall_ms, rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN)
+    args = parser.parse_args()
+
+    wall_ms, rows = profile(args.module)
+    imported = {name for _, _, _, name in rows}
+
+    print(f"import {args.module}: {wall_ms:.0f} ms wall (interpreter startup included), "
+          f"{len(rows)} modules\n")
+
+    print(f"Slowest imports (cumulative):")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {name}")
+
+    packages: dict[str, int] = {}
+    for self_us, _, _, name in rows:
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    print(f"\nSelf time per top-level package:")
+    for top, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:9.1f} ms  {top}")
+
+    failures = []
+    if wall_ms > args.budget_ms:
+        failures.append(f"import took {wall_ms:.0f} ms, budget is {args.budget_ms:.0f} ms")
+    leaked = sorted(m for m in args.forbid if m in imported)
+    if leaked:
+        failures.append(f"heavy modules imported at startup: {', '.join(leaked)}")
+
+    print()
+    if failures:
+        for failure in failures:
+            print("FAIL:", failure)
+        sys.exit(1)
+    print(f"OK: within {args.budget_ms:.0f} ms budget, no heavy modules imported")
+
+if __name__ == "__main__":
+    main()
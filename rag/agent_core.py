@@ -1,8 +1,20 @@
+import asyncio
+import threading
 from typing import Optional
 from llama_index.core.agent.workflow import FunctionAgent
-from rag.agent_tools import get_dsm5_tool, clear_last_sources
+from rag.agent_tools import get_dsm5_tool
 from rag.global_settings import init_llm_settings
-from rag.memory import get_memory, Memory
+from rag.memory import (
+    Memory,
+    SessionEntry,
+    get_session,
+    ensure_history_loaded,
+    persist_memory,
+    snapshot_memory,
+    restore_memory,
+    clear_memory,
+    list_sessions,
+)
 
 SYSTEM_PROMPT = """
 Bạn là một Trợ lý AI hỗ trợ sức khỏe tâm thần. Nhiệm vụ của bạn:
@@ -24,98 +36,116 @@ Bạn là một Trợ lý AI hỗ trợ sức khỏe tâm thần. Nhiệm vụ c
 Mục tiêu: hỗ trợ người dùng hiểu rõ hơn về triệu chứng, cung cấp thông tin đáng tin cậy và khuyến khích họ tìm hỗ trợ từ chuyên gia khi cần thiết.
 """
 
-# Cache: agent and memory by session_id
-_agent_cache: dict[str, FunctionAgent] = {}
-_memory_cache: dict[str, Memory] = {}
+# Process-wide agent: it holds no per-session state (memory is passed to run()),
+# so every session shares it and only costs a Memory object.
+_agent: Optional[FunctionAgent] = None
+_agent_lock = threading.Lock()
 
-def get_agent(session_id: Optional[str] = None) -> tuple[FunctionAgent, str, Memory]:
-    """
-    Return a cached instance of the mental health agent
-    """
-    global _agent_cache, _memory_cache
-    
-    init_llm_settings()
-    
-    # Get or create memory (this also generates session_id if needed)
-    memory, session_id = get_memory(session_id)
-    
-    # Cache memory
-    _memory_cache[session_id] = memory
-    
-    # Return cached agent if exists for this session
-    if session_id in _agent_cache:
-        return _agent_cache[session_id], session_id, memory
-    
+def _build_agent() -> FunctionAgent:
     # Create tools
     tools = [get_dsm5_tool()]
     
     # Create new agent (memory is passed to run(), not constructor)
-    agent = FunctionAgent(
+    return FunctionAgent(
         name="MentalHealthAgent",
         description="Trợ lý AI hỗ trợ sức khỏe tâm thần, sử dụng DSM-5 qua RAG.",
         system_prompt=SYSTEM_PROMPT,
         tools=tools,
         verbose=True,  # Enable for debugging
     )
+
+def get_shared_agent() -> FunctionAgent:
+    """
+    Return the process-wide mental health agent, building it on first use
+    """
+    global _agent
+    
+    if _agent is not None:
+        return _agent
     
-    # Cache the agent
-    _agent_cache[session_id] = agent
+    with _agent_lock:
+        if _agent is None:
+            init_llm_settings()
+            _agent = _build_agent()
+            print("Shared agent initialized")
     
-    print(f"Agent initialized for session: {session_id}")
-    return agent, session_id, memory
+    return _agent
+
+def _get_session_agent(session_id: Optional[str] = None) -> tuple[FunctionAgent, str, SessionEntry]:
+    # Get or create session (this also generates session_id if needed)
+    entry, session_id = get_session(session_id)
+    return get_shared_agent(), session_id, entry
+
+def get_agent(session_id: Optional[str] = None) -> tuple[FunctionAgent, str, Memory]:
+    """
+    Return the shared agent with the memory of a session
+    """
+    agent, session_id, entry = _get_session_agent(session_id)
+    return agent, session_id, entry.memory
 
 async def run_agent(message: str, session_id: Optional[str] = None) -> tuple[str, str]:
     """
     Run the agent with memory support
     """
-    # Get agent and memory
-    agent, session_id, memory = get_agent(session_id)
+    # Get agent and memory (restoring persisted history for evicted sessions)
+    agent, session_id, entry = _get_session_agent(session_id)
+    await ensure_history_loaded(session_id, entry)
     
     # Run agent with memory
-    response = await agent.run(user_msg=message, memory=memory)
+    response = await agent.run(user_msg=message, memory=entry.memory)
+    await persist_memory(session_id, entry)
     
     return str(response), session_id
 
-async def run_agent_stream(message: str, session_id: Optional[str] = None):
+async def run_agent_stream(
+    message: str,
+    session_id: Optional[str] = None,
+    approval: Optional["asyncio.Future[bool]"] = None,
+):
     """
-    Run the agent with streaming support
+    Run the agent with streaming support.
+    With `approval`, the finished turn is only persisted once the future
+    resolves to True; False (or cancellation) restores the session memory.
     """
     from llama_index.core.agent.workflow import AgentStream
     
-    # Get agent and memory
-    agent, session_id, memory = get_agent(session_id)
+    # Get agent and memory (restoring persisted history for evicted sessions)
+    agent, session_id, entry = _get_session_agent(session_id)
+    await ensure_history_loaded(session_id, entry)
+    memory = entry.memory
+    
+    # Snapshot history so a cancelled run (e.g. crisis verdict) leaves memory untouched
+    snapshot = await snapshot_memory(memory)
     
     # Run agent with streaming
     handler = agent.run(user_msg=message, memory=memory)
+    completed = False
     
-    async for event in handler.stream_events():
-        if isinstance(event, AgentStream):
-            yield event.delta, session_id
-    
-    # Ensure we await the final result to complete the memory update
-    await handler
+    try:
+        async for event in handler.stream_events():
+            if isinstance(event, AgentStream):
+                yield event.delta, session_id
+        
+        # Ensure we await the final result to complete the memory update
+        await handler
+        if approval is not None and not await approval:
+            return
+        completed = True
+        await persist_memory(session_id, entry)
+    finally:
+        if not completed:
+            try:
+                await handler.cancel_run()
+            except Exception as e:
+                print("Failed to cancel agent run:", e)
+            await restore_memory(memory, snapshot)
+            print(f"Agent run aborted, memory restored for session: {session_id}")
 
-def clear_agent_session(session_id: str) -> bool:
+async def clear_agent_session(session_id: str) -> bool:
     """
     Clear agent and memory for a specific session
     """
-    from rag.memory import clear_memory
-    
-    cleared = False
-    
-    if session_id in _agent_cache:
-        del _agent_cache[session_id]
-        cleared = True
-    
-    if session_id in _memory_cache:
-        del _memory_cache[session_id]
-        cleared = True
-        
-    if clear_memory(session_id):
-        cleared = True
-        
-    # Clear any stored sources
-    clear_last_sources()
+    cleared = await clear_memory(session_id)
     
     if cleared:
         print(f"Session cleared: {session_id}")
@@ -126,4 +156,4 @@ def list_active_sessions() -> list[str]:
     """
     List all active session IDs
     """
-    return list(_agent_cache.keys())
\ No newline at end of file
+    return list_sessions()
\ No newline at end of file
@@ -1,45 +1,72 @@
+from contextvars import ContextVar
+from typing import Optional
 from llama_index.core.tools import FunctionTool
-from rag.citation_engine import query_dsm5_with_sources
+from rag.citation_engine import query_dsm5_with_sources, aquery_dsm5_with_sources
 
-# Store the last query sources for retrieval by the API
-_last_query_sources: list[dict] = []
+# Run-scoped collector for the sources of DSM-5 queries.
+# Each request binds its own list; tool calls made during that agent run
+# write into it, so concurrent sessions never see each other's citations.
+_query_sources: ContextVar[Optional[list[dict]]] = ContextVar("dsm5_query_sources", default=None)
 
 def get_last_sources() -> list[dict]:
     """
-    Get the sources from the last DSM-5 query
+    Get the sources from the last DSM-5 query of the current request
     """
-    return _last_query_sources.copy()
+    sources = _query_sources.get()
+    return sources.copy() if sources else []
 
-def clear_last_sources():
-    """Clear the stored sources."""
-    global _last_query_sources
-    _last_query_sources = []
+def clear_last_sources() -> list[dict]:
+    """Bind a fresh source collector to the current request context."""
+    sources: list[dict] = []
+    _query_sources.set(sources)
+    return sources
+
+def _store_sources(sources: list[dict]):
+    # Store sources in the collector of the current run (if any)
+    collector = _query_sources.get()
+    if collector is not None:
+        collector[:] = sources
 
 def dsm5_query_with_citations(query: str) -> str:
     """
     Query DSM-5 knowledge base and store sources for later retrieval
     """
-    global _last_query_sources
-    
     print(f"\n🔍 DSM5Query TOOL CALLED with query: {query}")
     
     # Query with citations
     result = query_dsm5_with_sources(query)
+    sources = result.get("sources", [])
+    _store_sources(sources)
     
-    # Store sources for API to retrieve
-    _last_query_sources = result.get("sources", [])
-    
-    print(f"📚 Found {len(_last_query_sources)} sources")
+    print(f"📚 Found {len(sources)} sources")
     
     # Return just the answer for the agent
     return result.get("answer", "Không tìm thấy thông tin.")
 
+async def adsm5_query_with_citations(query: str) -> str:
+    """
+    Async DSM5Query used by the agent workflow.
+    Retrieval runs on the bounded retrieval pool and synthesis awaits the
+    LLM, so one worker can overlap many sessions' tool calls. It runs in
+    the workflow's task context, so the run-scoped collector is visible.
+    """
+    print(f"\n🔍 DSM5Query TOOL CALLED with query: {query}")
+    
+    result = await aquery_dsm5_with_sources(query)
+    sources = result.get("sources", [])
+    _store_sources(sources)
+    
+    print(f"📚 Found {len(sources)} sources")
+    
+    return result.get("answer", "Không tìm thấy thông tin.")
+
 def get_dsm5_tool() -> FunctionTool:
     """
     Return a FunctionTool for querying DSM-5 content with citations
     """
     tool = FunctionTool.from_defaults(
         fn=dsm5_query_with_citations,
+        async_fn=adsm5_query_with_citations,
         name="DSM5Query",
         description=(
             "Truy vấn kiến thức DSM-5 (Sổ tay Chẩn đoán và Thống kê Rối loạn Tâm thần) "
@@ -0,0 +1,397 @@
+import os
+import re
+import json
+import mmap
+import math
+import shutil
+import time
+from array import array
+from collections import Counter
+from typing import Iterable, Optional
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle, TextNode
+
+from rag.vi_tokenizer import VietnameseAnalyzer, VI_LEXICON, load_lexicon_file
+from rag.global_settings import (
+    BM25_ANALYZER,
+    BM25_FOLD_DIACRITICS,
+    BM25_FOLDED_WEIGHT,
+    BM25_VI_LEXICON_FILE,
+)
+
+BM25_FORMAT_VERSION = 2
+
+# Same token pattern as BM25Retriever (bm25s)
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+
+class RegexAnalyzer:
+    """
+    Previous BM25Retriever tokenization: lowercase \\w\\w+ tokens, bm25s
+    stopwords removed, then PyStemmer stemming (both English by default,
+    as in BM25Retriever.from_defaults), one field
+    """
+
+    name = "regex"
+    fields = ("text",)
+
+    def __init__(self, stopwords: Optional[str] = "en", stemmer: Optional[str] = "english"):
+        self.stopwords_language = stopwords
+        self.stemmer_language = stemmer
+        self.stopwords: frozenset[str] = frozenset()
+        self._stem = None
+        if stopwords:
+            from bm25s.tokenization import _infer_stopwords
+
+            self.stopwords = frozenset(_infer_stopwords(stopwords))
+        if stemmer:
+            import Stemmer
+
+            self._stem = Stemmer.Stemmer(stemmer).stemWords
+
+    def analyze(self, text: str) -> dict[str, list[str]]:
+        tokens = [t for t in _TOKEN_RE.findall(text.lower()) if t not in self.stopwords]
+        if self._stem is not None:
+            tokens = self._stem(tokens)
+        return {"text": tokens}
+
+    def config(self) -> dict:
+        return {"name": self.name, "stopwords": self.stopwords_language, "stemmer": self.stemmer_language}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RegexAnalyzer":
+        # Indexes written before stopwords/stemming were restored used neither
+        return cls(stopwords=config.get("stopwords"), stemmer=config.get("stemmer"))
+
+
+# Analyzer name → class; the config of the analyzer used at ingest is stored
+# with the index so queries are always tokenized the same way
+ANALYZERS = {
+    RegexAnalyzer.name: RegexAnalyzer,
+    VietnameseAnalyzer.name: VietnameseAnalyzer,
+}
+
+
+def make_analyzer(config: dict):
+    name = config.get("name")
+    if name not in ANALYZERS:
+        raise ValueError(f"Unknown BM25 analyzer: {name}. Expected one of {list(ANALYZERS)}")
+    return ANALYZERS[name].from_config(config)
+
+
+def get_default_analyzer():
+    """Analyzer configured in global_settings"""
+    if BM25_ANALYZER == VietnameseAnalyzer.name:
+        lexicon = list(VI_LEXICON) + load_lexicon_file(BM25_VI_LEXICON_FILE)
+        return VietnameseAnalyzer(lexicon=lexicon, fold=BM25_FOLD_DIACRITICS)
+    if BM25_ANALYZER == RegexAnalyzer.name:
+        return RegexAnalyzer()
+    return make_analyzer({"name": BM25_ANALYZER})
+
+
+def _node_record(node: BaseNode) -> dict:
+    """Fields needed to rebuild a node for BM25 results, citations and the reranker"""
+    return {
+        "id": node.node_id,
+        "text": node.get_content(metadata_mode=MetadataMode.NONE),
+        "metadata": node.metadata,
+        "excluded_embed_metadata_keys": node.excluded_embed_metadata_keys,
+        "excluded_llm_metadata_keys": node.excluded_llm_metadata_keys,
+    }
+
+
+class _FieldPostings:
+    """Term counts of one field, accumulated node by node in compact int32 arrays"""
+
+    def __init__(self):
+        self.vocab: dict[str, int] = {}
+        self.doc_ids = array("i")
+        self.term_ids = array("i")
+        self.tfs = array("i")
+        self.doc_len = array("f")
+
+    def add(self, doc: int, tokens: list[str]):
+        for term, tf in Counter(tokens).items():
+            self.doc_ids.append(doc)
+            self.term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+            self.tfs.append(tf)
+        self.doc_len.append(len(tokens))
+
+
+def _build_field(
+    postings: _FieldPostings,
+    out_dir: str,
+    field: str,
+    k1: float,
+    b: float,
+) -> dict:
+    """Write term dictionary + postings of one field; returns its stats"""
+    doc_len = np.frombuffer(postings.doc_len, dtype=np.float32)
+    num_docs = len(doc_len)
+    avgdl = float(doc_len.mean()) if num_docs and doc_len.sum() else 1.0
+
+    # Postings grouped by term (terms in sorted order), docs ascending within a term
+    terms = sorted(postings.vocab)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[[postings.vocab[term] for term in terms]] = np.arange(len(terms))
+    term_rank = rank[np.frombuffer(postings.term_ids, dtype=np.int32)]
+    order = np.lexsort((np.frombuffer(postings.doc_ids, dtype=np.int32), term_rank))
+    term_rank = term_rank[order]
+    docs = np.frombuffer(postings.doc_ids, dtype=np.int32)[order]
+    tf = np.frombuffer(postings.tfs, dtype=np.int32)[order].astype(np.float32)
+
+    df = np.bincount(term_rank, minlength=len(terms))
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+
+    # Lucene BM25 (same as bm25s' default); idf per term in float64, applied in float32
+    idf = np.array([math.log(1 + (num_docs - d + 0.5) / (d + 0.5)) for d in df.tolist()], dtype=np.float32)
+    norm = k1 * (1 - b + b * doc_len[docs] / avgdl)
+    weights = (idf[term_rank] * tf / (tf + norm)).astype(np.float32)
+
+    with open(os.path.join(out_dir, f"{field}.terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    np.save(os.path.join(out_dir, f"{field}.offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, f"{field}.postings_docs.npy"), docs)
+    np.save(os.path.join(out_dir, f"{field}.postings_weights.npy"), weights)
+
+    return {"num_terms": len(terms), "num_postings": int(offsets[-1]), "avgdl": avgdl}
+
+
+def build_bm25_index(
+    nodes: Iterable[BaseNode],
+    index_dir: str,
+    analyzer=None,
+    field_weights: Optional[dict[str, float]] = None,
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> dict:
+    """
+    Build the on-disk BM25 index from ingested nodes.
+    Node text is tokenized here, once, by `analyzer` (the one configured
+    in global_settings by default); queries reuse the analyzer config
+    saved with the index.
+    Layout of `index_dir`:
+    - meta.json                      corpus stats, BM25 params, field weights
+    - analyzer.json                  analyzer config (lexicon, stopwords, ...)
+    - <field>.terms.json             term dictionary (term → row in offsets)
+    - <field>.offsets.npy            int64 [V+1], postings range of each term
+    - <field>.postings_docs.npy      int32 doc indices, grouped by term
+    - <field>.postings_weights.npy   float32 precomputed BM25 weight of each posting
+    - node_ids.json                  node IDs in doc index order
+    - nodes.jsonl                    node text + metadata, one record per line
+    - node_offsets.npy               int64 [N+1], byte range of each record
+    - embeddings.npy                 float32 [N, dim] stored node embeddings (if any)
+    `nodes` is read once, so it can be a generator; node text and embeddings
+    are streamed to disk. The index is written to a temp directory and
+    swapped in at the end.
+    """
+    start = time.perf_counter()
+    analyzer = analyzer or get_default_analyzer()
+    field_weights = field_weights or {"folded": BM25_FOLDED_WEIGHT}
+    field_weights = {field: field_weights.get(field, 1.0) for field in analyzer.fields}
+
+    tmp_dir = f"{index_dir.rstrip('/')}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # One pass over `nodes` (may be a generator): only postings, offsets and
+    # IDs stay in memory; text and embeddings go straight to disk
+    postings = {field: _FieldPostings() for field in analyzer.fields}
+    node_ids: list[str] = []
+    node_offsets = array("q", [0])
+    dim, all_embedded = None, True
+    tokenize_s = 0.0
+    raw_embeddings_path = os.path.join(tmp_dir, "embeddings.f32")
+    with open(os.path.join(tmp_dir, "nodes.jsonl"), "wb") as f, open(raw_embeddings_path, "wb") as emb_f:
+        for doc, node in enumerate(nodes):
+            tokenize_start = time.perf_counter()
+            for field, tokens in analyzer.analyze(node.get_content(metadata_mode=MetadataMode.EMBED)).items():
+                postings[field].add(doc, tokens)
+            tokenize_s += time.perf_counter() - tokenize_start
+
+            line = json.dumps(_node_record(node), ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            node_offsets.append(node_offsets[-1] + len(line))
+            node_ids.append(node.node_id)
+
+            if node.embedding is None or (dim is not None and len(node.embedding) != dim):
+                all_embedded = False
+            elif all_embedded:
+                dim = len(node.embedding)
+                emb_f.write(np.asarray(node.embedding, dtype=np.float32).tobytes())
+    tokenize_ms = tokenize_s * 1000
+
+    num_docs = len(node_ids)
+    fields = {}
+    for field in analyzer.fields:
+        fields[field] = _build_field(postings.pop(field), tmp_dir, field, k1, b)
+        fields[field]["weight"] = field_weights[field]
+
+    np.save(os.path.join(tmp_dir, "node_offsets.npy"), np.frombuffer(node_offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "node_ids.json"), "w", encoding="utf-8") as f:
+        json.dump(node_ids, f)
+
+    if num_docs and all_embedded:
+        # Raw float32 rows → .npy, copied in chunks
+        raw = np.memmap(raw_embeddings_path, dtype=np.float32, mode="r", shape=(num_docs, dim))
+        out = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(num_docs, dim)
+        )
+        for i in range(0, num_docs, 4096):
+            out[i:i + 4096] = raw[i:i + 4096]
+        out.flush()
+        del raw, out
+    os.remove(raw_embeddings_path)
+
+    with open(os.path.join(tmp_dir, "analyzer.json"), "w", encoding="utf-8") as f:
+        json.dump(analyzer.config(), f, ensure_ascii=False)
+
+    meta = {
+        "version": BM25_FORMAT_VERSION,
+        "analyzer": analyzer.name,
+        "num_docs": num_docs,
+        "fields": fields,
+        "k1": k1,
+        "b": b,
+        "tokenize_ms": round(tokenize_ms, 1),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    old_dir = f"{index_dir.rstrip('/')}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    summary = ", ".join(f"{name}: {f['num_terms']} terms / {f['num_postings']} postings" for name, f in fields.items())
+    print(f"BM25 index built ({analyzer.name}): {num_docs} docs, {summary} "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return meta
+
+
+class BM25Field:
+    """Memory-mapped term dictionary + postings of one field"""
+
+    def __init__(self, index_dir: str, field: str, weight: float):
+        with open(os.path.join(index_dir, f"{field}.terms.json"), "r", encoding="utf-8") as f:
+            self.term_ids = {term: i for i, term in enumerate(json.load(f))}
+        self.weight = weight
+        self.offsets = np.load(os.path.join(index_dir, f"{field}.offsets.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(index_dir, f"{field}.postings_docs.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_dir, f"{field}.postings_weights.npy"), mmap_mode="r")
+
+    def accumulate(self, scores: np.ndarray, tokens: list[str]):
+        for term in tokens:
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.docs[lo:hi]] += self.weight * self.weights[lo:hi]
+
+
+class BM25Index:
+    """
+    Read-only BM25 index over memory-mapped numpy arrays.
+    Loading maps the files instead of reading them, so startup is fast and
+    pages are shared by the OS across API workers.
+    """
+
+    def __init__(self, index_dir: str):
+        meta_path = os.path.join(index_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"BM25 index not found: {index_dir}. Please run ingestion first.")
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != BM25_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version {self.meta.get('version')}, please re-run ingestion")
+
+        with open(os.path.join(index_dir, "analyzer.json"), "r", encoding="utf-8") as f:
+            self.analyzer = make_analyzer(json.load(f))
+
+        self.index_dir = index_dir
+        self.num_docs = self.meta["num_docs"]
+        self.fields = {
+            name: BM25Field(index_dir, name, stats["weight"])
+            for name, stats in self.meta["fields"].items()
+            if stats["weight"] > 0
+        }
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """Return up to top_k (doc index, score) pairs with score > 0"""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        tokens = self.analyzer.analyze(query)
+        for name, field in self.fields.items():
+            field.accumulate(scores, tokens.get(name, []))
+
+        top_k = min(top_k, self.num_docs)
+        if top_k <= 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+class NodeStore:
+    """Node text + metadata (and stored embeddings) read lazily from the BM25 index directory"""
+
+    def __init__(self, index_dir: str):
+        self.offsets = np.load(os.path.join(index_dir, "node_offsets.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "nodes.jsonl"), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+        embeddings_path = os.path.join(index_dir, "embeddings.npy")
+        self.embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+
+        # Only the ID column is read eagerly
+        with open(os.path.join(index_dir, "node_ids.json"), "r", encoding="utf-8") as f:
+            self.index_of: dict[str, int] = {node_id: i for i, node_id in enumerate(json.load(f))}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _record(self, i: int) -> dict:
+        return json.loads(self._data[self.offsets[i]:self.offsets[i + 1]])
+
+    def get(self, i: int) -> TextNode:
+        record = self._record(i)
+        return TextNode(
+            id_=record["id"],
+            text=record["text"],
+            metadata=record["metadata"],
+            excluded_embed_metadata_keys=record["excluded_embed_metadata_keys"],
+            excluded_llm_metadata_keys=record["excluded_llm_metadata_keys"],
+        )
+
+    def get_by_id(self, node_id: str) -> Optional[TextNode]:
+        i = self.index_of.get(node_id)
+        return self.get(i) if i is not None else None
+
+    def get_embedding(self, node_id: str) -> Optional[np.ndarray]:
+        i = self.index_of.get(node_id)
+        if i is None or self.embeddings is None:
+            return None
+        return np.asarray(self.embeddings[i])
+
+
+class CompactBM25Retriever(BaseRetriever):
+    """BM25 retriever over a prebuilt BM25Index + NodeStore (drop-in for BM25Retriever)"""
+
+    def __init__(self, index: BM25Index, store: NodeStore, similarity_top_k: int):
+        super().__init__()
+        self.index = index
+        self.store = store
+        self.similarity_top_k = similarity_top_k
+
+    @classmethod
+    def from_dir(cls, index_dir: str, similarity_top_k: int) -> "CompactBM25Retriever":
+        return cls(BM25Index(index_dir), NodeStore(index_dir), similarity_top_k)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        hits = self.index.search(query_bundle.query_str, self.similarity_top_k)
+        return [NodeWithScore(node=self.store.get(i), score=score) for i, score in hits]
@@ -2,7 +2,11 @@ from dataclasses import dataclass
 from llama_index.core import Settings
 from llama_index.core.schema import NodeWithScore
 
-from rag.hybrid_retriever import hybrid_retrieve_with_fallback, clear_retriever_cache
+from rag.hybrid_retriever import (
+    hybrid_retrieve_with_fallback,
+    ahybrid_retrieve_with_fallback,
+    clear_retriever_cache,
+)
 from rag.global_settings import (
     init_llm_settings,
     RERANK_TOP_N,
@@ -80,12 +84,10 @@ def extract_sources_from_nodes(nodes: list[NodeWithScore]) -> list[SourceInfo]:
     
     return sources
 
-def synthesize_response(query: str, nodes: list[NodeWithScore]) -> str:
+def build_prompt(query: str, nodes: list[NodeWithScore]) -> str:
     """
-    Generate response from LLM using retrieved nodes as context.
+    Build the synthesis prompt using retrieved nodes as context.
     """
-    init_llm_settings()
-    
     # Build context from nodes
     context_parts = []
     for i, node in enumerate(nodes, 1):
@@ -94,11 +96,26 @@ def synthesize_response(query: str, nodes: list[NodeWithScore]) -> str:
     
     context_str = "\n\n".join(context_parts)
     
-    # Create prompt
-    prompt = RESPONSE_TEMPLATE_VI.format(context_str=context_str, query_str=query)
+    return RESPONSE_TEMPLATE_VI.format(context_str=context_str, query_str=query)
+
+def synthesize_response(query: str, nodes: list[NodeWithScore]) -> str:
+    """
+    Generate response from LLM using retrieved nodes as context.
+    """
+    init_llm_settings()
     
     # Get response from LLM
-    response = Settings.llm.complete(prompt)
+    response = Settings.llm.complete(build_prompt(query, nodes))
+    
+    return str(response)
+
+async def asynthesize_response(query: str, nodes: list[NodeWithScore]) -> str:
+    """
+    Async synthesize_response using the LLM's acomplete.
+    """
+    init_llm_settings()
+    
+    response = await Settings.llm.acomplete(build_prompt(query, nodes))
     
     return str(response)
 
@@ -133,6 +150,33 @@ def query_with_citations(query: str) -> CitationResponse:
         is_fallback=False,
     )
 
+async def aquery_with_citations(query: str) -> CitationResponse:
+    """
+    Async query_with_citations: retrieval runs on the bounded retrieval
+    pool and synthesis uses the async LLM API
+    """
+    nodes, should_fallback = await ahybrid_retrieve_with_fallback(
+        query=query,
+        top_n=RERANK_TOP_N,
+        threshold=RELEVANCE_THRESHOLD,
+    )
+    
+    if should_fallback or not nodes:
+        return CitationResponse(
+            answer=FALLBACK_RESPONSE,
+            sources=[],
+            is_fallback=True,
+        )
+    
+    answer = await asynthesize_response(query, nodes)
+    sources = extract_sources_from_nodes(nodes)[:MAX_SOURCES_RETURN]
+    
+    return CitationResponse(
+        answer=answer,
+        sources=sources,
+        is_fallback=False,
+    )
+
 def query_dsm5_with_sources(query: str) -> dict:
     """
     Query DSM-5 and return structured response with sources
@@ -141,6 +185,13 @@ def query_dsm5_with_sources(query: str) -> dict:
     result = query_with_citations(query)
     return result.to_dict()
 
+async def aquery_dsm5_with_sources(query: str) -> dict:
+    """
+    Async query_dsm5_with_sources, used by the agent tool
+    """
+    result = await aquery_with_citations(query)
+    return result.to_dict()
+
 def reset_citation_engine():
     """Reset all cached instances"""
     clear_retriever_cache()
@@ -0,0 +1,403 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: NFC, lowercase, collapsed whitespace."""
+    query = unicodedata.normalize("NFC", query).lower()
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+class MmapVectorSpill:
+    """
+    Persistent ring buffer of float32 vectors in a memory-mapped file.
+    A small SQLite index maps keys to slots; when full, the oldest slot
+    is overwritten. The file may be shared by several worker processes:
+    slots are allocated from the SQLite index under its write lock, and a
+    slot is unmapped before its vector is overwritten. Keys are stored as
+    sha256 digests, never as the query text. The mapping is synced to disk
+    every `flush_every` writes and on close().
+    """
+
+    def __init__(self, path: str, capacity: int, flush_every: int = 256):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._vectors: Optional[np.memmap] = None
+        self._conn = sqlite3.connect(
+            f"{path}.idx",
+            check_same_thread=False,
+            timeout=30,
+            isolation_level=None,  # explicit transactions below
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS slots ("
+            " key TEXT PRIMARY KEY,"
+            " slot INTEGER NOT NULL UNIQUE)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        if not self._meta("hashed_keys"):
+            # Older indexes keyed slots by the plaintext query: drop them
+            self._conn.execute("DELETE FROM slots")
+            self._set_meta("hashed_keys", 1)
+            self._conn.execute("VACUUM")
+
+        self.dim = self._meta("dim")
+        if self.dim:
+            self._open(self.dim)
+
+    def _meta(self, name: str) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value: int):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _open(self, dim: int):
+        mode = "r+" if os.path.exists(self.path) else "w+"
+        self._vectors = np.memmap(self.path, dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+
+    @staticmethod
+    def _hash(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _slot_of(self, key: str) -> Optional[int]:
+        row = self._conn.execute("SELECT slot FROM slots WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        key = self._hash(key)
+        with self._lock:
+            if self._vectors is None:
+                # Another process may have created the file since
+                self.dim = self._meta("dim")
+                if not self.dim:
+                    return None
+                self._open(self.dim)
+            slot = self._slot_of(key)
+            if slot is None:
+                return None
+            vector = np.array(self._vectors[slot])
+            # A writer unmaps a slot before overwriting it: if the key still
+            # maps to the slot after the copy, the copy is its vector
+            if self._slot_of(key) != slot:
+                return None
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        key = self._hash(key)
+        with self._lock:
+            conn = self._conn
+            # Allocate the slot and unmap it in one write transaction, so no
+            # other process gets the same slot or reads it while it changes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                dim = self._meta("dim")
+                if dim is None:
+                    dim = int(vector.shape[0])
+                    self._set_meta("dim", dim)
+                if vector.shape[0] != dim:
+                    conn.execute("ROLLBACK")
+                    return
+                if self._vectors is None:
+                    self.dim = dim
+                    self._open(dim)
+
+                slot = (self._meta("next_slot") or 0) % self.capacity
+                self._set_meta("next_slot", slot + 1)
+                conn.execute("DELETE FROM slots WHERE slot = ? OR key = ?", (slot, key))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            self._vectors[slot] = vector
+            conn.execute("INSERT OR REPLACE INTO slots (key, slot) VALUES (?, ?)", (key, slot))
+            # The mapping is shared, so other processes see the vector now;
+            # syncing it to disk is only for durability and is batched
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self._vectors is not None and self._unflushed:
+            self._vectors.flush()
+        self._unflushed = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._vectors = None
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of normalized query → float32 embedding, with optional disk spill"""
+
+    def __init__(self, max_size: int, spill: Optional[MmapVectorSpill] = None):
+        self.max_size = max_size
+        self.spill = spill
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        if self.spill is not None:
+            vector = self.spill.get(key)
+            if vector is not None:
+                with self._lock:
+                    self._put(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._put(key, vector)
+        if self.spill is not None:
+            self.spill.put(key, vector)
+
+    def _put(self, key: str, vector: np.ndarray):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+        stats["spill_size"] = len(self.spill) if self.spill is not None else 0
+        return stats
+
+
+class CachedQueryEmbedding(BaseEmbedding):
+    """
+    Embedding model wrapper that memoizes query embeddings.
+    Text (document) embeddings are passed straight to the wrapped model.
+    """
+
+    _inner: Any = PrivateAttr()
+    _cache: QueryEmbeddingCache = PrivateAttr()
+    _namespace: str = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: QueryEmbeddingCache, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._cache = cache
+        # Different models must never share cached vectors
+        self._namespace = hashlib.sha256(inner.model_name.encode("utf-8")).hexdigest()[:8]
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedQueryEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    @property
+    def cache(self) -> QueryEmbeddingCache:
+        return self._cache
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        key = f"{self._namespace}:{normalize_query(query)}"
+
+        vector = self._cache.get(key)
+        if vector is None:
+            vector = np.asarray(self._inner._get_query_embedding(query), dtype=np.float32)
+            self._cache.set(key, vector)
+
+        return vector.tolist()
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._inner._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self._inner._get_text_embeddings(texts)
+
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return self._get_text_embedding(text)
+
+
+class TextEmbeddingMemo:
+    """
+    Run-scoped memo of text embeddings shared by all ingestion stages.
+    Identical texts (repeated headings, a node equal to a sentence window)
+    are embedded once; per-stage counters record requested vs computed.
+    With a `store` (SQLiteIngestCache), misses are looked up on disk and
+    new vectors written through, so they are reused by later runs too.
+    """
+
+    def __init__(self, max_size: int = 4096, store: Optional[Any] = None):
+        self.max_size = max_size
+        self.store = store
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict[str, int]] = {}
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                return vector
+
+        if self.store is not None:
+            vector = self.store.get_embedding(key)
+            if vector is not None:
+                self._put(key, vector)
+        return vector
+
+    def set(self, key: str, vector: np.ndarray):
+        self._put(key, vector)
+        if self.store is not None:
+            self.store.put_embedding(key, vector)
+
+    def _put(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record(self, stage: str, requested: int = 0, computed: int = 0, precomputed: int = 0):
+        with self._lock:
+            counts = self._stages.setdefault(stage, {"requested": 0, "computed": 0, "precomputed": 0})
+            counts["requested"] += requested
+            counts["computed"] += computed
+            counts["precomputed"] += precomputed
+
+    def report(self) -> dict:
+        """Per-stage counts: texts requested, embedded by the model, and reused"""
+        with self._lock:
+            stages = {}
+            for stage, counts in self._stages.items():
+                stages[stage] = dict(counts, reused=counts["requested"] - counts["computed"])
+            return {
+                "stages": stages,
+                "total_computed": sum(c["computed"] for c in self._stages.values()),
+                "memo_size": len(self._entries),
+            }
+
+    def take_counts(self) -> dict[str, dict[str, int]]:
+        """Return the per-stage counters and reset them (vectors are kept)"""
+        with self._lock:
+            stages, self._stages = self._stages, {}
+            return stages
+
+    def merge_counts(self, stages: dict[str, dict[str, int]]):
+        """Add counters taken from another memo (e.g. an ingest worker process)"""
+        for stage, counts in stages.items():
+            self.record(stage, **counts)
+
+
+class StageEmbedding(BaseEmbedding):
+    """
+    One ingestion stage's view of the shared embedding model.
+    Text embeddings go through the run's TextEmbeddingMemo, so a text is
+    only sent to the model the first time any stage asks for it.
+    """
+
+    _inner: Any = PrivateAttr()
+    _stage: str = PrivateAttr()
+    _memo: TextEmbeddingMemo = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, stage: str, memo: TextEmbeddingMemo, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._stage = stage
+        self._memo = memo
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StageEmbedding"
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._memo.key(text) for text in texts]
+        vectors = {key: self._memo.get(key) for key in set(keys)}
+
+        # Embed each missing text once, in one batch
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            first_text = {}
+            for key, text in zip(keys, texts):
+                first_text.setdefault(key, text)
+            computed = self._inner._get_text_embeddings([first_text[key] for key in missing])
+            for key, embedding in zip(missing, computed):
+                vectors[key] = np.asarray(embedding, dtype=np.float32)
+                self._memo.set(key, vectors[key])
+
+        self._memo.record(self._stage, requested=len(texts), computed=len(missing))
+        return [vectors[key].tolist() for key in keys]
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return self._get_text_embedding(text)
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._inner._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
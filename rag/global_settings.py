@@ -1,7 +1,7 @@
 import os
+import time
+import threading
 from dotenv import load_dotenv
-from llama_index.llms.groq import Groq
-from llama_index.core import Settings
 
 load_dotenv()
 
@@ -10,40 +10,199 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 HF_TOKEN = os.getenv("HF_TOKEN")
 
 # Paths
-CACHE_FILE = "data/cache/pipeline_cache.json"
+INGEST_CACHE_DB = "data/cache/ingest_cache.sqlite"  # Split results + text embeddings (float32 blobs)
+INGEST_CACHE_MAX_AGE_DAYS = 30  # run_ingest.py --compact-cache drops entries unused for longer
 STORAGE_PATH = "data/ingestion_storage/"
-FILES_PATH = [f"{STORAGE_PATH}/dsm-5-sach-tieng-viet.docx"]
+DOCS_DIR = STORAGE_PATH  # Every supported document under it is ingested (recursively)
+DOC_EXTENSIONS = (".docx", ".pdf", ".txt", ".md")
+INGEST_MANIFEST_FILE = "data/ingest_manifest.json"  # File/node hashes of the last ingest
 ASSESSMENT_DIR = "data/assessments"
 CHROMA_DIR = "data/chroma/"
-NODES_FILE = "data/nodes/nodes.pkl"
+BM25_INDEX_DIR = "data/bm25/"  # Prebuilt BM25 index + node text (memory-mapped)
+INDEX_VERSION_FILE = "data/index_version.txt"  # Rewritten on every index build
+
+# Chroma vector index (space, M and ef_construction only apply when the
+# collection is created: changing them makes the next run_ingest.py build a
+# new collection and switch queries to it)
+CHROMA_COLLECTION = "dsm5_collection"
+CHROMA_ACTIVE_FILE = "data/chroma_collection.txt"  # Name of the collection queries use
+CHROMA_HNSW_SPACE = "cosine"        # "cosine", "l2" or "ip"; the embedding model is trained for cosine
+CHROMA_HNSW_M = 16                  # Links per node (max_neighbors): recall vs memory and build time
+CHROMA_HNSW_EF_CONSTRUCTION = 200   # Candidates while building: recall vs build time
+CHROMA_HNSW_EF_SEARCH = 100         # Candidates per query: recall vs latency (applied on open)
+CHROMA_UPSERT_BATCH = 4096          # Vectors per upsert/delete call (capped by the client's max batch size)
 
 # Hybrid Search
 VECTOR_TOP_K = 10          # Number of results from vector search
 BM25_TOP_K = 10            # Number of results from BM25 search
 FUSION_TOP_K = 15          # Number of results after RRF fusion
+RRF_K = 60                 # Reciprocal Rank Fusion constant
+VECTOR_TIMEOUT = 5.0       # Seconds for query embedding + vector search
+BM25_TIMEOUT = 2.0         # Seconds for BM25 search
+
+# BM25 tokenization (applied at ingest; the index stores the analyzer it was built with)
+BM25_ANALYZER = "vi"           # "vi" (word segmentation + stopwords) or "regex" (previous tokenizer)
+BM25_FOLD_DIACRITICS = True    # Extra diacritic-free field so "roi loan" matches "rối loạn"
+BM25_FOLDED_WEIGHT = 0.5       # Weight of the folded field relative to the exact field
+BM25_VI_LEXICON_FILE = None    # Extra Vietnamese words for segmentation, one per line
 
 # Reranker
 RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
 RERANK_TOP_N = 5           # Final number of results after reranking
+RERANK_BACKEND = "torch"   # "torch", "torch-int8" (dynamic quantization) or "onnx"
+RERANK_ONNX_FILE = None    # ONNX file inside the model repo, e.g. "onnx/model_qint8_avx512_vnni.onnx"
+RERANK_DEVICE = None       # Device for the "torch" backend ("cuda", "cpu"...); None picks a GPU if available
+RERANK_MAX_LENGTH = 512    # Max tokens per (query, passage) pair; longer passages are truncated
+RERANK_BATCH_WINDOW_MS = 5  # Window for micro-batching concurrent rerank requests
+RERANK_MAX_BATCH = 64      # Max pairs per forward pass
+
+# Rerank cascade (cosine pre-filter before the cross-encoder)
+RERANK_CASCADE = False          # Enable the cascade in hybrid_retrieve_with_rerank
+CASCADE_MIN_SIMILARITY = 0.25   # Best cosine below this → clearly irrelevant, skip reranker
+CASCADE_KEEP_MARGIN = 0.15      # Keep candidates within this cosine of the best one
+CASCADE_MIN_KEEP = RERANK_TOP_N  # Never send fewer candidates to the reranker
 
 # Fallback
 RELEVANCE_THRESHOLD = 0.6  # reranker score
 
+# Retrieval pool
+RETRIEVAL_WORKERS = 4  # Threads for CPU-bound retrieval/reranking from async code
+
+# Warm-up (API startup)
+WARMUP_ON_STARTUP = True   # Preload models and indexes in the background at startup
+
+# Retrieval result cache
+RETRIEVAL_CACHE_MAX_ENTRIES = 2048  # Cached query results (LRU)
+RETRIEVAL_CACHE_MAX_BYTES = 4 * 1024 * 1024  # Upper bound on cache size
+
 # Embedding Model
 EMBEDDING_MODEL_NAME = "AITeamVN/Vietnamese_Embedding"
+EMBED_BATCH_SIZE = 64  # Texts per forward pass when embedding documents
+QUERY_EMBED_CACHE_SIZE = 2048  # Query embeddings kept in memory (LRU)
+QUERY_EMBED_SPILL_FILE = "data/cache/query_embeddings.f32"  # mmap spill file, None to disable
+QUERY_EMBED_SPILL_CAPACITY = 50000  # Max vectors in the spill file (oldest overwritten)
+
+# Ingestion (changing these re-ingests every document)
+SPLITTER_BUFFER_SIZE = 1               # Sentences grouped when comparing neighbours
+SPLITTER_BREAKPOINT_PERCENTILE = 95    # Similarity drop (percentile) that starts a new node
+INGEST_SHARD_CHARS = 100_000           # Documents are split into shards of about this size at line breaks
+INGEST_WORKERS = 1                     # Processes splitting/embedding shards (run_ingest.py --workers)
+INGEST_BATCH_SIZE = 256                # Nodes embedded, written to Chroma and checkpointed together
+INGEST_STAGING_DIR = "data/ingest_staging/"  # Nodes of an unfinished ingest + checkpoint (resume)
 
 # Citation
 MAX_SOURCES_RETURN = 5  # Maximum number of sources to return in response
 
+# Safety
+SAFETY_LLM_TIMEOUT = 5.0  # Seconds to wait for LLM safety verdict before keyword fallback
+SPECULATIVE_AGENT_RUN = True  # Start the agent while the safety verdict is pending (tokens buffered)
+VERDICT_CACHE_SIZE = 4096  # Max LLM safety verdicts kept in memory (LRU)
+VERDICT_CACHE_TTL = 24 * 3600  # Seconds before a cached verdict expires
+VERDICT_CACHE_DB = "data/cache/safety_verdicts.sqlite"  # Set to None to keep the cache in memory only
+VERDICT_CACHE_DB_MAX_ROWS = 100_000  # Verdicts kept on disk (oldest dropped first, expired ones always)
+
 # Memory
 TOKEN_LIMIT = 10000  # Total tokens for memory
 TOKEN_FLUSH_SIZE = 1000  # Tokens to flush when limit exceeded
 CHAT_HISTORY_TOKEN_RATIO = 0.7  # 70% for chat history, 30% for memory blocks
 
+# Sessions
+SESSION_DIR = "data/sessions"  # Persisted chat history (sharded SQLite, WAL)
+HISTORY_SHARDS = 8  # Number of SQLite files the chat history is spread over
+MAX_SESSIONS = 1000  # Max live sessions kept in memory (LRU eviction)
+SESSION_IDLE_TTL = 3600  # Seconds of inactivity before a session is evicted from memory
+SESSION_SWEEP_INTERVAL = 60  # Seconds between idle-eviction sweeps
+
+# LLM client
+LLM_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+LLM_MAX_CONNECTIONS = 50  # Pooled HTTP connections to the LLM API
+LLM_MAX_KEEPALIVE = 20  # Idle connections kept open for reuse
+LLM_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection stays in the pool
+LLM_HTTP_TIMEOUT = 60.0  # Seconds per LLM HTTP request
+
+_llm_lock = threading.Lock()
+_llm_initialized = False
+_llm_stats = {
+    "init_calls": 0,
+    "constructions": 0,
+    "construction_ms": 0.0,
+    "requests": 0,
+    "new_connections": 0,
+}
+
+def _trace_connection(event_name: str, info: dict):
+    """httpcore trace callback: a TCP connect means the pool opened a new connection."""
+    if event_name == "connection.connect_tcp.complete":
+        with _llm_lock:
+            _llm_stats["new_connections"] += 1
+
+async def _atrace_connection(event_name: str, info: dict):
+    _trace_connection(event_name, info)
+
+def _trace_request(request):
+    request.extensions["trace"] = _trace_connection
+
+async def _atrace_request(request):
+    request.extensions["trace"] = _atrace_connection
+
+def _count_response(response):
+    with _llm_lock:
+        _llm_stats["requests"] += 1
+
+async def _acount_response(response):
+    _count_response(response)
+
 def init_llm_settings():
-    """Initialize global LLM settings once across the system."""
-    Settings.llm = Groq(
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        api_key=GROQ_API_KEY,
-        temperature=0.6,
-    )
\ No newline at end of file
+    """
+    Initialize global LLM settings once across the system.
+    Idempotent and thread-safe: later calls are no-ops, so the Groq client
+    and its pooled keep-alive HTTP connections are reused for every request.
+    """
+    global _llm_initialized
+    
+    with _llm_lock:
+        _llm_stats["init_calls"] += 1
+        if _llm_initialized:
+            return
+        
+        start = time.perf_counter()
+        # Imported here: Groq pulls in the OpenAI SDK and all of llama_index.core
+        import httpx
+        from llama_index.llms.groq import Groq
+        from llama_index.core import Settings
+        
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        )
+        
+        Settings.llm = Groq(
+            model=LLM_MODEL,
+            api_key=GROQ_API_KEY,
+            temperature=0.6,
+            http_client=httpx.Client(
+                limits=limits,
+                timeout=LLM_HTTP_TIMEOUT,
+                event_hooks={"request": [_trace_request], "response": [_count_response]},
+            ),
+            async_http_client=httpx.AsyncClient(
+                limits=limits,
+                timeout=LLM_HTTP_TIMEOUT,
+                event_hooks={"request": [_atrace_request], "response": [_acount_response]},
+            ),
+        )
+        
+        _llm_stats["constructions"] += 1
+        _llm_stats["construction_ms"] += (time.perf_counter() - start) * 1000
+        _llm_initialized = True
+        print(f"LLM client initialized in {_llm_stats['construction_ms']:.1f} ms")
+
+def llm_client_stats() -> dict:
+    """Client construction cost and HTTP connection reuse counters."""
+    with _llm_lock:
+        stats = dict(_llm_stats)
+    stats["construction_ms"] = round(stats["construction_ms"], 2)
+    # Requests the pool served without opening a connection
+    stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+    return stats
\ No newline at end of file
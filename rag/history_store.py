@@ -0,0 +1,176 @@
+import os
+import time
+import json
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Protocol
+from llama_index.core.llms import ChatMessage
+
+
+class HistoryConflict(Exception):
+    """The stored history changed since the caller last read it"""
+
+
+class HistoryBackend(Protocol):
+    """Persistent chat history shared by all API workers"""
+
+    def load(self, session_id: str) -> list[ChatMessage]:
+        ...
+
+    def count(self, session_id: str) -> int:
+        ...
+
+    def append(self, session_id: str, messages: list[ChatMessage], start: Optional[int] = None) -> int:
+        ...
+
+    def replace(self, session_id: str, messages: list[ChatMessage]) -> int:
+        ...
+
+    def delete(self, session_id: str) -> bool:
+        ...
+
+    async def aload(self, session_id: str) -> list[ChatMessage]:
+        ...
+
+    async def acount(self, session_id: str) -> int:
+        ...
+
+    async def aappend(self, session_id: str, messages: list[ChatMessage], start: Optional[int] = None) -> int:
+        ...
+
+    async def areplace(self, session_id: str, messages: list[ChatMessage]) -> int:
+        ...
+
+    async def adelete(self, session_id: str) -> bool:
+        ...
+
+
+class SQLiteHistoryBackend:
+    """
+    Chat history in SQLite files (WAL mode), sharded by session_id.
+    Several uvicorn workers can read and append concurrently; sharding keeps
+    the single-writer lock of each file short. Async methods run the
+    blocking queries in a worker thread.
+    """
+
+    def __init__(self, directory: str, shards: int = 8):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shards = shards
+        self._conns: list[sqlite3.Connection] = []
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+        for i in range(shards):
+            conn = sqlite3.connect(
+                os.path.join(directory, f"history-{i:02d}.sqlite"),
+                check_same_thread=False,
+                timeout=30,
+                isolation_level=None,  # explicit transactions below
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_messages ("
+                " session_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " message TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (session_id, seq))"
+            )
+            self._conns.append(conn)
+
+    def _shard(self, session_id: str) -> int:
+        digest = hashlib.md5(session_id.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "little") % self.shards
+
+    def _insert(self, conn: sqlite3.Connection, session_id: str, start: int, messages: list[ChatMessage]):
+        now = time.time()
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, seq, message, created_at) VALUES (?, ?, ?, ?)",
+            [
+                (session_id, start + i, json.dumps(m.model_dump(mode="json"), ensure_ascii=False), now)
+                for i, m in enumerate(messages)
+            ],
+        )
+
+    def load(self, session_id: str) -> list[ChatMessage]:
+        shard = self._shard(session_id)
+        with self._locks[shard]:
+            rows = self._conns[shard].execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+        return [ChatMessage.model_validate(json.loads(row[0])) for row in rows]
+
+    def count(self, session_id: str) -> int:
+        shard = self._shard(session_id)
+        with self._locks[shard]:
+            row = self._conns[shard].execute(
+                "SELECT COUNT(*) FROM chat_messages WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return row[0]
+
+    def append(self, session_id: str, messages: list[ChatMessage], start: Optional[int] = None) -> int:
+        """
+        Append messages after the last stored turn, return the new total.
+        With `start` (the count the caller's history was based on), raise
+        HistoryConflict instead if another worker appended since.
+        """
+        shard = self._shard(session_id)
+        conn = self._conns[shard]
+        with self._locks[shard]:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                (count,) = conn.execute(
+                    "SELECT COUNT(*) FROM chat_messages WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+                if start is not None and start != count:
+                    raise HistoryConflict(f"session {session_id} has {count} stored messages, expected {start}")
+                self._insert(conn, session_id, count, messages)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return count + len(messages)
+
+    def replace(self, session_id: str, messages: list[ChatMessage]) -> int:
+        """Overwrite the whole history of a session, return the new total."""
+        shard = self._shard(session_id)
+        conn = self._conns[shard]
+        with self._locks[shard]:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+                self._insert(conn, session_id, 0, messages)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(messages)
+
+    def delete(self, session_id: str) -> bool:
+        shard = self._shard(session_id)
+        with self._locks[shard]:
+            cur = self._conns[shard].execute(
+                "DELETE FROM chat_messages WHERE session_id = ?", (session_id,)
+            )
+        return cur.rowcount > 0
+
+    async def aload(self, session_id: str) -> list[ChatMessage]:
+        return await asyncio.to_thread(self.load, session_id)
+
+    async def acount(self, session_id: str) -> int:
+        return await asyncio.to_thread(self.count, session_id)
+
+    async def aappend(self, session_id: str, messages: list[ChatMessage], start: Optional[int] = None) -> int:
+        return await asyncio.to_thread(self.append, session_id, messages, start)
+
+    async def areplace(self, session_id: str, messages: list[ChatMessage]) -> int:
+        return await asyncio.to_thread(self.replace, session_id, messages)
+
+    async def adelete(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self.delete, session_id)
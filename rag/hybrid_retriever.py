@@ -1,44 +1,269 @@
+import time
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from typing import Optional
-from llama_index.core.retrievers import QueryFusionRetriever
-from llama_index.core.postprocessor import SentenceTransformerRerank
-from llama_index.core.schema import NodeWithScore, QueryBundle
-from llama_index.retrievers.bm25 import BM25Retriever
+import numpy as np
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
 
-from rag.index_builder import load_index, get_embed_model
-from rag.ingest_pipeline import load_nodes
+from rag.index_builder import load_index, get_embed_model, get_chroma_collection
+from rag.embedding_cache import normalize_query
+from rag.retrieval_cache import RetrievalResultCache, FileFingerprint
+from rag.rerank_service import RerankService
+from rag.bm25_index import CompactBM25Retriever
 from rag.global_settings import (
     VECTOR_TOP_K,
     BM25_TOP_K, 
+    BM25_INDEX_DIR,
     FUSION_TOP_K,
     RERANKER_MODEL,
     RERANK_TOP_N,
+    RERANK_BACKEND,
+    RERANK_MAX_LENGTH,
+    RERANK_BATCH_WINDOW_MS,
+    RERANK_MAX_BATCH,
+    RERANK_ONNX_FILE,
+    RERANK_DEVICE,
+    RERANK_CASCADE,
+    CASCADE_MIN_SIMILARITY,
+    CASCADE_KEEP_MARGIN,
+    CASCADE_MIN_KEEP,
     RELEVANCE_THRESHOLD,
+    RETRIEVAL_WORKERS,
+    VECTOR_TIMEOUT,
+    BM25_TIMEOUT,
+    RRF_K,
+    INDEX_VERSION_FILE,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_MAX_BYTES,
 )
 
 # Cached instances
-_hybrid_retriever: Optional[QueryFusionRetriever] = None
-_reranker: Optional[SentenceTransformerRerank] = None
-_bm25_retriever: Optional[BM25Retriever] = None
+_hybrid_retriever: Optional["HybridRetriever"] = None
+_reranker: Optional[RerankService] = None
+_bm25_retriever: Optional[CompactBM25Retriever] = None
+_result_cache: Optional[RetrievalResultCache] = None
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+_fanout_executor: Optional[ThreadPoolExecutor] = None
+# Loaders may race (warm-up threads vs. first requests); each has its own lock
+_hybrid_lock = threading.Lock()
+_reranker_lock = threading.Lock()
+_bm25_lock = threading.Lock()
 
 
-def get_bm25_retriever() -> BM25Retriever:
-    """Get or create BM25 retriever from saved nodes"""
+class RetrievalMetrics:
+    """Aggregated per-stage latency (ms) of hybrid retrieval"""
+    
+    STAGES = ("embed", "vector", "bm25", "fusion", "cascade", "rerank", "total")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.degraded = 0
+            self.cascade_pruned = 0
+            self.cascade_skipped = 0
+            self._count = {stage: 0 for stage in self.STAGES}
+            self._sum = {stage: 0.0 for stage in self.STAGES}
+            self._max = {stage: 0.0 for stage in self.STAGES}
+    
+    def record(self, timings: dict[str, float], degraded: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.degraded += int(degraded)
+            for stage, ms in timings.items():
+                if stage not in self._count:
+                    continue
+                self._count[stage] += 1
+                self._sum[stage] += ms
+                self._max[stage] = max(self._max[stage], ms)
+    
+    def record_cascade(self, pruned: int, skipped: bool):
+        with self._lock:
+            self.cascade_pruned += pruned
+            self.cascade_skipped += int(skipped)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "degraded": self.degraded,
+                "cascade_pruned_candidates": self.cascade_pruned,
+                "cascade_skipped_rerank": self.cascade_skipped,
+                "stages_ms": {
+                    stage: {
+                        "count": self._count[stage],
+                        "avg": round(self._sum[stage] / self._count[stage], 2) if self._count[stage] else 0.0,
+                        "max": round(self._max[stage], 2),
+                    }
+                    for stage in self.STAGES
+                },
+            }
+
+
+retrieval_metrics = RetrievalMetrics()
+
+
+def reciprocal_rank_fusion(
+    results: list[list[NodeWithScore]],
+    top_k: int,
+    k: int = RRF_K,
+) -> list[NodeWithScore]:
+    """
+    Fuse ranked lists with RRF (same scoring as QueryFusionRetriever):
+    score = sum(1 / (rank + k)) over the lists a node appears in
+    """
+    fused_scores: dict[str, float] = {}
+    hash_to_node: dict[str, NodeWithScore] = {}
+    
+    for nodes in results:
+        ranked = sorted(nodes, key=lambda n: n.score or 0.0, reverse=True)
+        for rank, node in enumerate(ranked):
+            key = node.node.hash
+            hash_to_node.setdefault(key, node)
+            fused_scores[key] = fused_scores.get(key, 0.0) + 1.0 / (rank + k)
+    
+    ordered = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
+    
+    fused = []
+    for key, score in ordered[:top_k]:
+        node = hash_to_node[key]
+        fused.append(NodeWithScore(node=node.node, score=score))
+    return fused
+
+
+def get_fanout_executor() -> ThreadPoolExecutor:
+    """
+    Pool used to run vector and BM25 search concurrently.
+    Separate from the retrieval pool (callers run there) so fan-out can
+    never deadlock; sized for a timed-out search still running.
+    """
+    global _fanout_executor
+    
+    if _fanout_executor is None:
+        _fanout_executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS * 4,
+            thread_name_prefix="retrieval-fanout",
+        )
+    return _fanout_executor
+
+
+class HybridRetriever:
+    """
+    Vector + BM25 retrieval fanned out in parallel and fused with RRF.
+    Each side has its own timeout; if one is slow or fails, the results
+    degrade to the other retriever alone.
+    If `vector_collection` is given, the vector retriever is rebuilt when
+    an ingest switches queries to another Chroma collection.
+    """
+    
+    def __init__(
+        self,
+        vector_retriever,
+        bm25_retriever: CompactBM25Retriever,
+        embed_model,
+        similarity_top_k: int = FUSION_TOP_K,
+        vector_timeout: float = VECTOR_TIMEOUT,
+        bm25_timeout: float = BM25_TIMEOUT,
+        vector_collection=None,
+    ):
+        self.vector_retriever = vector_retriever
+        self.bm25_retriever = bm25_retriever
+        self.embed_model = embed_model
+        self.similarity_top_k = similarity_top_k
+        self.timeouts = {"vector": vector_timeout, "bm25": bm25_timeout}
+        self.vector_collection = vector_collection
+        self._refresh_lock = threading.Lock()
+    
+    def _current_vector_retriever(self):
+        if self.vector_collection is None:
+            return self.vector_retriever
+        collection = get_chroma_collection()
+        if collection is not self.vector_collection:
+            with self._refresh_lock:
+                if collection is not self.vector_collection:
+                    index = load_index(self.embed_model)
+                    if index is not None:
+                        self.vector_retriever = index.as_retriever(similarity_top_k=VECTOR_TOP_K)
+                        self.vector_collection = collection
+                        print(f"Vector retriever switched to Chroma collection {collection.name}")
+        return self.vector_retriever
+    
+    def _vector_search(self, query: str, timings: dict) -> list[NodeWithScore]:
+        start = time.perf_counter()
+        embedding = self.embed_model.get_query_embedding(query)
+        timings["embed"] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        nodes = self._current_vector_retriever().retrieve(QueryBundle(query_str=query, embedding=embedding))
+        timings["vector"] = (time.perf_counter() - start) * 1000
+        return nodes
+    
+    def _bm25_search(self, query: str, timings: dict) -> list[NodeWithScore]:
+        start = time.perf_counter()
+        nodes = self.bm25_retriever.retrieve(query)
+        timings["bm25"] = (time.perf_counter() - start) * 1000
+        return nodes
+    
+    def retrieve_with_timings(self, query: str) -> tuple[list[NodeWithScore], dict[str, float], bool]:
+        """
+        Return (fused nodes, per-stage timings in ms, degraded flag)
+        """
+        timings: dict[str, float] = {}
+        executor = get_fanout_executor()
+        start = time.perf_counter()
+        
+        futures = {
+            "vector": executor.submit(self._vector_search, query, timings),
+            "bm25": executor.submit(self._bm25_search, query, timings),
+        }
+        
+        results = []
+        for name, future in futures.items():
+            remaining = self.timeouts[name] - (time.perf_counter() - start)
+            try:
+                results.append(future.result(timeout=max(remaining, 0.0)))
+            except FuturesTimeout:
+                print(f"{name} retrieval timed out after {self.timeouts[name]}s, using single retriever")
+            except Exception as e:
+                print(f"{name} retrieval failed, using single retriever:", e)
+        
+        degraded = len(results) < len(futures)
+        
+        fusion_start = time.perf_counter()
+        nodes = reciprocal_rank_fusion(results, self.similarity_top_k)
+        timings["fusion"] = (time.perf_counter() - fusion_start) * 1000
+        
+        # Copy: a timed-out search may still write into `timings` later
+        return nodes, dict(timings), degraded
+    
+    def retrieve(self, query: str) -> list[NodeWithScore]:
+        nodes, timings, degraded = self.retrieve_with_timings(query)
+        retrieval_metrics.record(timings, degraded)
+        return nodes
+
+
+def get_bm25_retriever() -> CompactBM25Retriever:
+    """Get or load the BM25 retriever from the prebuilt on-disk index"""
     global _bm25_retriever
     
     if _bm25_retriever is not None:
         return _bm25_retriever
     
-    nodes = load_nodes()
-    _bm25_retriever = BM25Retriever.from_defaults(
-        nodes=nodes,
-        similarity_top_k=BM25_TOP_K,
-    )
-    
-    print(f"BM25 retriever initialized with {len(nodes)} nodes")
+    with _bm25_lock:
+        if _bm25_retriever is None:
+            start = time.perf_counter()
+            _bm25_retriever = CompactBM25Retriever.from_dir(BM25_INDEX_DIR, similarity_top_k=BM25_TOP_K)
+            print(f"BM25 retriever loaded with {len(_bm25_retriever.store)} nodes "
+                  f"in {(time.perf_counter() - start) * 1000:.1f} ms")
     return _bm25_retriever
 
 
-def get_hybrid_retriever() -> QueryFusionRetriever:
+def get_hybrid_retriever() -> HybridRetriever:
     """
     Get or create Hybrid Retriever combining Vector + BM25 with RRF fusion
     """
@@ -47,71 +272,180 @@ def get_hybrid_retriever() -> QueryFusionRetriever:
     if _hybrid_retriever is not None:
         return _hybrid_retriever
     
-    # Load vector index
-    index = load_index()
-    if index is None:
-        raise ValueError("No ChromaDB index found. Please run ingestion first.")
-    
-    # Create vector retriever
-    vector_retriever = index.as_retriever(similarity_top_k=VECTOR_TOP_K)
-    
-    # Create BM25 retriever
-    bm25_retriever = get_bm25_retriever()
-    
-    # Create hybrid retriever with Reciprocal Rank Fusion
-    _hybrid_retriever = QueryFusionRetriever(
-        retrievers=[vector_retriever, bm25_retriever],
-        mode="reciprocal_rerank",  # RRF fusion
-        similarity_top_k=FUSION_TOP_K,
-        num_queries=1,  # No query expansion
-        use_async=False,
-    )
-    
-    print("Hybrid retriever initialized (Vector + BM25 + RRF)")
+    with _hybrid_lock:
+        if _hybrid_retriever is not None:
+            return _hybrid_retriever
+        
+        # Load vector index (sharing the embed model used for query embedding)
+        embed_model = get_embed_model()
+        collection = get_chroma_collection()
+        index = load_index(embed_model)
+        if index is None:
+            raise ValueError("No ChromaDB index found. Please run ingestion first.")
+        
+        # Create vector retriever
+        vector_retriever = index.as_retriever(similarity_top_k=VECTOR_TOP_K)
+        
+        # Create BM25 retriever
+        bm25_retriever = get_bm25_retriever()
+        
+        # Create hybrid retriever: parallel fan-out + Reciprocal Rank Fusion
+        _hybrid_retriever = HybridRetriever(
+            vector_retriever=vector_retriever,
+            bm25_retriever=bm25_retriever,
+            embed_model=embed_model,
+            similarity_top_k=FUSION_TOP_K,
+            vector_collection=collection,
+        )
+        
+        print("Hybrid retriever initialized (Vector || BM25 + RRF)")
     return _hybrid_retriever
 
 
-def get_reranker() -> SentenceTransformerRerank:
-    """Get or create BGE Reranker"""
+def get_node_by_id(node_id: str) -> Optional[BaseNode]:
+    """Resolve a node ID to its node (used to rebuild cached results)"""
+    return get_bm25_retriever().store.get_by_id(node_id)
+
+
+def get_node_embedding(node_id: str) -> Optional[np.ndarray]:
+    """Embedding stored for a node at ingest time, if any"""
+    return get_bm25_retriever().store.get_embedding(node_id)
+
+
+def get_result_cache() -> RetrievalResultCache:
+    """Get or create the retrieval result cache"""
+    global _result_cache
+    
+    if _result_cache is None:
+        _result_cache = RetrievalResultCache(
+            max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+            max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+            fingerprint_fn=FileFingerprint(INDEX_VERSION_FILE),
+        )
+    return _result_cache
+
+
+def get_reranker() -> RerankService:
+    """Get or create the micro-batching BGE reranking service"""
     global _reranker
     
     if _reranker is not None:
         return _reranker
     
-    _reranker = SentenceTransformerRerank(
-        model=RERANKER_MODEL,
-        top_n=RERANK_TOP_N,
-        keep_retrieval_score=True,  # Keep original scores for debugging
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = RerankService(
+                model_name=RERANKER_MODEL,
+                backend=RERANK_BACKEND,
+                max_length=RERANK_MAX_LENGTH,
+                batch_window_ms=RERANK_BATCH_WINDOW_MS,
+                max_batch_pairs=RERANK_MAX_BATCH,
+                onnx_file=RERANK_ONNX_FILE,
+                device=RERANK_DEVICE,
+            )
+            print(f"Reranker initialized: {RERANKER_MODEL} ({RERANK_BACKEND})")
+    return _reranker
+
+
+def cascade_prune(
+    query: str,
+    nodes: list[NodeWithScore],
+    min_keep: int,
+) -> list[NodeWithScore]:
+    """
+    Cheap first stage of the rerank cascade.
+    Scores candidates by cosine similarity between the (cached) query
+    embedding and the node embeddings stored at ingest time, then:
+    - returns [] if even the best candidate is clearly irrelevant
+      (best < CASCADE_MIN_SIMILARITY), so the cross-encoder is skipped;
+    - otherwise keeps candidates within CASCADE_KEEP_MARGIN of the best
+      (at least `min_keep`) for the cross-encoder, in RRF order.
+    Candidates without a stored embedding always survive.
+    """
+    query_vec = np.asarray(get_hybrid_retriever().embed_model.get_query_embedding(query), dtype=np.float32)
+    query_vec /= np.linalg.norm(query_vec) or 1.0
+    
+    similarities: list[Optional[float]] = []
+    for node in nodes:
+        embedding = node.node.embedding or get_node_embedding(node.node.node_id)
+        if embedding is None:
+            similarities.append(None)
+            continue
+        vec = np.asarray(embedding, dtype=np.float32)
+        similarities.append(float(vec @ query_vec / (np.linalg.norm(vec) or 1.0)))
+    
+    known = [sim for sim in similarities if sim is not None]
+    if not known:
+        return nodes
+    
+    best = max(known)
+    if best < CASCADE_MIN_SIMILARITY and len(known) == len(nodes):
+        print(f"Cascade: best similarity {best:.3f} below {CASCADE_MIN_SIMILARITY}, skipping reranker")
+        return []
+    
+    # Rank by similarity, keep everything close to the best (never fewer than min_keep)
+    ranked = sorted(
+        range(len(nodes)),
+        key=lambda i: similarities[i] if similarities[i] is not None else float("inf"),
+        reverse=True,
     )
+    keep = set(ranked[:min_keep])
+    keep.update(i for i, sim in enumerate(similarities) if sim is None or sim >= best - CASCADE_KEEP_MARGIN)
     
-    print(f"Reranker initialized: {RERANKER_MODEL}")
-    return _reranker
+    return [node for i, node in enumerate(nodes) if i in keep]
 
 
 def hybrid_retrieve_with_rerank(
     query: str,
     top_n: Optional[int] = None,
+    cascade: Optional[bool] = None,
 ) -> list[NodeWithScore]:
     """
     Perform hybrid retrieval with reranking
+    (optionally pruning candidates with the cosine cascade first)
     """
     if top_n is None:
         top_n = RERANK_TOP_N
+    if cascade is None:
+        cascade = RERANK_CASCADE
+    
+    start = time.perf_counter()
     
-    # Hybrid retrieval (Vector + BM25 + RRF)
+    # Hybrid retrieval (Vector || BM25 + RRF)
     retriever = get_hybrid_retriever()
-    nodes = retriever.retrieve(query)
+    nodes, timings, degraded = retriever.retrieve_with_timings(query)
     
     if not nodes:
         print("No nodes retrieved from hybrid search")
+        timings["total"] = (time.perf_counter() - start) * 1000
+        retrieval_metrics.record(timings, degraded)
         return []
     
     print(f"Hybrid retrieval: {len(nodes)} candidates")
     
+    # Cascade: drop candidates the cross-encoder does not need to see
+    if cascade:
+        cascade_start = time.perf_counter()
+        candidates = cascade_prune(query, nodes, min_keep=max(top_n, CASCADE_MIN_KEEP))
+        timings["cascade"] = (time.perf_counter() - cascade_start) * 1000
+        retrieval_metrics.record_cascade(pruned=len(nodes) - len(candidates), skipped=not candidates)
+        
+        if not candidates:
+            timings["total"] = (time.perf_counter() - start) * 1000
+            retrieval_metrics.record(timings, degraded)
+            return []
+        
+        print(f"Cascade: {len(candidates)}/{len(nodes)} candidates sent to reranker")
+        nodes = candidates
+    
     # Rerank
+    rerank_start = time.perf_counter()
     reranker = get_reranker()
-    query_bundle = QueryBundle(query_str=query)
-    reranked_nodes = reranker.postprocess_nodes(nodes, query_bundle)
+    reranked_nodes = reranker.rerank(query, nodes, top_n)
+    timings["rerank"] = (time.perf_counter() - rerank_start) * 1000
+    
+    timings["total"] = (time.perf_counter() - start) * 1000
+    retrieval_metrics.record(timings, degraded)
     
     print(f"After reranking: {len(reranked_nodes)} results")
     
@@ -126,9 +460,38 @@ def hybrid_retrieve_with_fallback(
     """
     Perform hybrid retrieval with reranking and fallback check
     """
+    if top_n is None:
+        top_n = RERANK_TOP_N
     if threshold is None:
         threshold = RELEVANCE_THRESHOLD
     
+    # Deterministic for a given query and index version → serve from cache
+    cache = get_result_cache()
+    key = cache.make_key(normalize_query(query), top_n, threshold)
+    cached = cache.get(key, get_node_by_id)
+    if cached is not None:
+        print("Retrieval cache hit")
+        return cached
+    
+    return _retrieve_and_cache(key, query, top_n, threshold)
+
+
+def _retrieve_and_cache(
+    key: str,
+    query: str,
+    top_n: int,
+    threshold: float,
+) -> tuple[list[NodeWithScore], bool]:
+    nodes, should_fallback = _retrieve_with_fallback(query, top_n, threshold)
+    get_result_cache().set(key, nodes, should_fallback)
+    return nodes, should_fallback
+
+
+def _retrieve_with_fallback(
+    query: str,
+    top_n: int,
+    threshold: float,
+) -> tuple[list[NodeWithScore], bool]:
     nodes = hybrid_retrieve_with_rerank(query, top_n)
     
     # Check if we should fallback
@@ -152,10 +515,65 @@ def hybrid_retrieve_with_fallback(
     return relevant_nodes, False
 
 
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """
+    Bounded pool for CPU-bound retrieval (embedding, BM25, reranker).
+    Torch releases the GIL during inference, so threads overlap well.
+    """
+    global _retrieval_executor
+    
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS,
+            thread_name_prefix="retrieval",
+        )
+    return _retrieval_executor
+
+
+async def ahybrid_retrieve_with_fallback(
+    query: str,
+    top_n: Optional[int] = None,
+    threshold: Optional[float] = None,
+) -> tuple[list[NodeWithScore], bool]:
+    """
+    Async hybrid_retrieve_with_fallback: runs on the retrieval pool so the
+    event loop keeps serving other sessions
+    """
+    if top_n is None:
+        top_n = RERANK_TOP_N
+    if threshold is None:
+        threshold = RELEVANCE_THRESHOLD
+    
+    # Cache hits are answered on the loop without a thread hop
+    cache = get_result_cache()
+    key = cache.make_key(normalize_query(query), top_n, threshold)
+    cached = cache.get(key, get_node_by_id)
+    if cached is not None:
+        print("Retrieval cache hit")
+        return cached
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_retrieval_executor(),
+        functools.partial(_retrieve_and_cache, key, query, top_n, threshold),
+    )
+
+
+def retrieval_stats() -> dict:
+    """Per-stage latency metrics (embed, vector, bm25, fusion, rerank) and result cache stats"""
+    stats = retrieval_metrics.stats()
+    stats["result_cache"] = get_result_cache().stats()
+    if _reranker is not None:
+        stats["reranker"] = _reranker.stats()
+    return stats
+
+
 def clear_retriever_cache():
     """Clear all cached retriever instances"""
     global _hybrid_retriever, _reranker, _bm25_retriever
     _hybrid_retriever = None
     _reranker = None
     _bm25_retriever = None
+    if _result_cache is not None:
+        _result_cache.clear()
     print("Retriever cache cleared")
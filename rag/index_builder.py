@@ -1,53 +1,307 @@
 import os
-import chromadb
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.core import (
-    StorageContext,
-    VectorStoreIndex,
-    Settings,
+import time
+import uuid
+import threading
+from typing import TYPE_CHECKING, Optional
+from rag.global_settings import (
+    CHROMA_DIR,
+    CHROMA_COLLECTION,
+    CHROMA_ACTIVE_FILE,
+    CHROMA_HNSW_SPACE,
+    CHROMA_HNSW_M,
+    CHROMA_HNSW_EF_CONSTRUCTION,
+    CHROMA_HNSW_EF_SEARCH,
+    CHROMA_UPSERT_BATCH,
+    INDEX_VERSION_FILE,
+    EMBEDDING_MODEL_NAME,
+    EMBED_BATCH_SIZE,
+    QUERY_EMBED_CACHE_SIZE,
+    QUERY_EMBED_SPILL_FILE,
+    QUERY_EMBED_SPILL_CAPACITY,
 )
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from rag.global_settings import CHROMA_DIR, EMBEDDING_MODEL_NAME
+
+# chromadb, HuggingFace/torch and llama_index are imported on first use,
+# so importing this module (e.g. for stats) stays cheap
+if TYPE_CHECKING:
+    from rag.embedding_cache import CachedQueryEmbedding, QueryEmbeddingCache, TextEmbeddingMemo
 
 os.makedirs(CHROMA_DIR, exist_ok=True)
 
+# Cached instances
+_query_embedding_cache: Optional["QueryEmbeddingCache"] = None
+_embed_model: Optional["CachedQueryEmbedding"] = None
+_embed_model_lock = threading.Lock()
+_chroma_client = None
+_chroma_collection = None
+_chroma_lock = threading.Lock()
+_active_name: tuple[Optional[int], str] = (None, CHROMA_COLLECTION)
+
+def get_query_embedding_cache() -> "QueryEmbeddingCache":
+    """Get or create the process-wide query embedding cache."""
+    global _query_embedding_cache
+
+    if _query_embedding_cache is not None:
+        return _query_embedding_cache
+
+    from rag.embedding_cache import QueryEmbeddingCache, MmapVectorSpill
+
+    spill = None
+    if QUERY_EMBED_SPILL_FILE:
+        spill = MmapVectorSpill(QUERY_EMBED_SPILL_FILE, capacity=QUERY_EMBED_SPILL_CAPACITY)
+
+    _query_embedding_cache = QueryEmbeddingCache(max_size=QUERY_EMBED_CACHE_SIZE, spill=spill)
+    return _query_embedding_cache
+
+def close_query_embedding_cache():
+    """Sync the query embedding spill to disk and close it (server shutdown); the cache stays in memory."""
+    cache = _query_embedding_cache
+    if cache is not None and cache.spill is not None:
+        spill, cache.spill = cache.spill, None
+        spill.close()
+
+def query_embedding_stats() -> dict:
+    """Hit-rate stats of the query embedding cache."""
+    return get_query_embedding_cache().stats()
+
+def create_embed_model():
+    """Load a new, unwrapped instance of the embedding model (e.g. for an ingest worker process)."""
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    return HuggingFaceEmbedding(model_name=EMBEDDING_MODEL_NAME, embed_batch_size=EMBED_BATCH_SIZE)
+
 def get_embed_model():
-    """Initialize and return the embedding model."""
-    embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL_NAME)
-    Settings.embed_model = embed_model
-    return embed_model
+    """Get or load the shared embedding model (query embeddings memoized)."""
+    global _embed_model
 
-def build_index(nodes):
-    print("Building ChromaDB index...")
+    if _embed_model is not None:
+        return _embed_model
 
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    collection = client.get_or_create_collection("dsm5_collection")
+    with _embed_model_lock:
+        if _embed_model is None:
+            from llama_index.core import Settings
+            from rag.embedding_cache import CachedQueryEmbedding
 
-    vector_store = ChromaVectorStore(chroma_collection=collection)
+            _embed_model = CachedQueryEmbedding(create_embed_model(), cache=get_query_embedding_cache())
+            Settings.embed_model = _embed_model
+    return _embed_model
+
+def hnsw_configuration() -> dict:
+    """HNSW parameters of the collection, from global_settings"""
+    return {
+        "space": CHROMA_HNSW_SPACE,
+        "max_neighbors": CHROMA_HNSW_M,
+        "ef_construction": CHROMA_HNSW_EF_CONSTRUCTION,
+        "ef_search": CHROMA_HNSW_EF_SEARCH,
+    }
+
+def _fixed_hnsw(configuration: dict) -> tuple:
+    # Parameters set when a collection is created, never changed afterwards
+    return tuple(configuration.get(key) for key in ("space", "max_neighbors", "ef_construction"))
 
-    embed_model = get_embed_model()
-    storage = StorageContext.from_defaults(vector_store=vector_store)
+def _collection_hnsw(collection) -> dict:
+    return (collection.configuration or {}).get("hnsw") or {}
 
-    index = VectorStoreIndex(
-        nodes,
-        storage_context=storage,
-        embed_model=embed_model
-    )
+def _open_collection(name: str):
+    # Caller holds _chroma_lock
+    global _chroma_client
+
+    if _chroma_client is None:
+        import chromadb
+
+        _chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+    collection = _chroma_client.get_or_create_collection(name, configuration={"hnsw": hnsw_configuration()})
+    if _collection_hnsw(collection).get("ef_search") != CHROMA_HNSW_EF_SEARCH:
+        collection.modify(configuration={"hnsw": {"ef_search": CHROMA_HNSW_EF_SEARCH}})
+    return collection
+
+def active_collection_name() -> str:
+    """Name of the collection queries use (CHROMA_ACTIVE_FILE, re-read only when it changes)"""
+    global _active_name
+
+    try:
+        mtime = os.stat(CHROMA_ACTIVE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return CHROMA_COLLECTION
+    if mtime != _active_name[0]:
+        with open(CHROMA_ACTIVE_FILE, "r", encoding="utf-8") as f:
+            _active_name = (mtime, f.read().strip() or CHROMA_COLLECTION)
+    return _active_name[1]
+
+def get_chroma_collection():
+    """
+    Get or open the active persistent DSM-5 Chroma collection; reopened
+    when an ingest switches queries to a new collection.
+    """
+    global _chroma_collection
+
+    name = active_collection_name()
+    collection = _chroma_collection
+    if collection is not None and collection.name == name:
+        return collection
+
+    with _chroma_lock:
+        if _chroma_collection is None or _chroma_collection.name != name:
+            _chroma_collection = _open_collection(name)
+            current = _collection_hnsw(_chroma_collection)
+            if _fixed_hnsw(current) != _fixed_hnsw(hnsw_configuration()):
+                print(f"Chroma collection {name} was created with HNSW space/M/ef_construction "
+                      f"{_fixed_hnsw(current)}; run `python run_ingest.py` to rebuild it with the configured parameters.")
+    return _chroma_collection
+
+def open_ingest_collection(rebuild: bool):
+    """
+    Collection an ingest writes to. Incremental ingests, and rebuilds with
+    unchanged HNSW parameters, update the active collection in place (by
+    ID), so processes serving queries keep a valid handle. A rebuild with
+    changed parameters fills a new collection, which activate_collection()
+    switches queries to once it is complete.
+    """
+    active = get_chroma_collection()
+    if not rebuild or _fixed_hnsw(_collection_hnsw(active)) == _fixed_hnsw(hnsw_configuration()):
+        return active
+    space, m, ef_construction = _fixed_hnsw(hnsw_configuration())
+    with _chroma_lock:
+        return _open_collection(f"{CHROMA_COLLECTION}_{space}_m{m}_efc{ef_construction}")
+
+def activate_collection(collection):
+    """
+    Switch queries to `collection` (atomic rewrite of CHROMA_ACTIVE_FILE).
+    The collection it replaces is kept until the next switch, for queries
+    still running on it; older ones are dropped.
+    """
+    previous = active_collection_name()
+    if collection.name == previous:
+        return
+
+    tmp_path = f"{CHROMA_ACTIVE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(collection.name)
+    os.replace(tmp_path, CHROMA_ACTIVE_FILE)
+
+    for other in _chroma_client.list_collections():
+        if other.name.startswith(CHROMA_COLLECTION) and other.name not in (collection.name, previous):
+            _chroma_client.delete_collection(other.name)
+    print(f"Chroma: queries now use collection {collection.name} (was {previous})")
+
+def embed_missing(nodes, memo: "TextEmbeddingMemo", stage: str):
+    """Embed nodes that carry no embedding yet with the shared model (counted in `memo` under `stage`)"""
+    from llama_index.core.schema import MetadataMode
+    from rag.embedding_cache import StageEmbedding
+
+    missing = [node for node in nodes if node.embedding is None]
+    if missing:
+        stage_model = StageEmbedding(get_embed_model(), stage, memo)
+        embeddings = stage_model.get_text_embedding_batch(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in missing]
+        )
+        for node, embedding in zip(missing, embeddings):
+            node.embedding = embedding
+    memo.record(stage, precomputed=len(nodes) - len(missing))
+
+def sync_index(
+    upserts,
+    delete_ids=(),
+    memo: Optional["TextEmbeddingMemo"] = None,
+    collection=None,
+) -> dict:
+    """
+    Apply an ingest to a Chroma collection (the active one by default):
+    upsert `upserts` by node ID in large batches, so re-ingesting a
+    document replaces its vectors instead of duplicating them, then delete
+    `delete_ids`. Nodes already carry their embeddings; missing ones are
+    computed.
+    """
+    import numpy as np
+    from llama_index.core.schema import MetadataMode
+    from llama_index.core.vector_stores.utils import node_to_metadata_dict
+    from rag.embedding_cache import TextEmbeddingMemo
+
+    memo = memo or TextEmbeddingMemo()
+    embed_missing(upserts, memo, "index_build")
+
+    collection = collection or get_chroma_collection()
+    batch_size = min(CHROMA_UPSERT_BATCH, _chroma_client.get_max_batch_size())
+
+    for i in range(0, len(upserts), batch_size):
+        batch = upserts[i:i + batch_size]
+        metadatas = []
+        for node in batch:
+            # Same record layout as ChromaVectorStore.add
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+            metadatas.append({key: "" if value is None else value for key, value in metadata.items()})
+        collection.upsert(
+            ids=[node.node_id for node in batch],
+            embeddings=np.asarray([node.embedding for node in batch], dtype=np.float32),
+            metadatas=metadatas,
+            documents=[node.get_content(metadata_mode=MetadataMode.NONE) for node in batch],
+        )
+
+    delete_ids = list(delete_ids)
+    for i in range(0, len(delete_ids), batch_size):
+        collection.delete(ids=delete_ids[i:i + batch_size])
+
+    write_index_version()
+    count = collection.count()
+    print(f"Chroma: {len(delete_ids)} vectors deleted, {len(upserts)} upserted ({count} in {collection.name})")
+    return {"deleted": len(delete_ids), "upserted": len(upserts), "count": count}
+
+def prune_collection(keep_ids, memo: Optional["TextEmbeddingMemo"] = None, collection=None) -> dict:
+    """
+    Delete every vector of a Chroma collection (the active one by default)
+    whose ID is not in `keep_ids`. Ingests call it after their upserts, so
+    a served collection is never emptied ahead of its replacement vectors.
+    """
+    collection = collection or get_chroma_collection()
+    keep_ids = set(keep_ids)
+    stale_ids = [node_id for node_id in collection.get(include=[])["ids"] if node_id not in keep_ids]
+    return sync_index([], stale_ids, memo, collection=collection)
+
+def build_index(nodes, memo: Optional["TextEmbeddingMemo"] = None):
+    """
+    Replace the Chroma collection contents with `nodes`, using the
+    embeddings they already carry (see sync_index).
+    """
+    from llama_index.core import VectorStoreIndex
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
+    print("Building ChromaDB index...")
+    collection = open_ingest_collection(rebuild=True)
+    sync_index(nodes, memo=memo, collection=collection)
+    prune_collection([node.node_id for node in nodes], memo, collection)
+    activate_collection(collection)
+
+    vector_store = ChromaVectorStore(chroma_collection=collection)
+    index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=get_embed_model())
 
     print(f"Chroma index created at {CHROMA_DIR}")
     return index
 
-def load_index():
+def write_index_version() -> str:
+    """Stamp a new index version; caches keyed on it are invalidated."""
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:12]}"
+    os.makedirs(os.path.dirname(INDEX_VERSION_FILE) or ".", exist_ok=True)
+
+    tmp_path = f"{INDEX_VERSION_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, INDEX_VERSION_FILE)
+
+    return version
+
+def load_index(embed_model=None):
+    from llama_index.core import VectorStoreIndex
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
     try:
-        client = chromadb.PersistentClient(path=CHROMA_DIR)
-        collection = client.get_or_create_collection("dsm5_collection")
+        collection = get_chroma_collection()
 
         if collection.count() == 0:
             print("Chroma collection empty — no index to load.")
             return None
 
         vector_store = ChromaVectorStore(chroma_collection=collection)
-        embed_model = get_embed_model()
+        if embed_model is None:
+            embed_model = get_embed_model()
 
         index = VectorStoreIndex.from_vector_store(
             vector_store=vector_store,
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.constants import DATA_KEY
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+TABLES = ("nodes", "embeddings")
+
+
+class SQLiteIngestCache:
+    """
+    On-disk cache of ingestion results, read one key at a time.
+    - nodes: split result of a document shard (node JSON, zlib-compressed)
+    - embeddings: text embeddings as float32 blobs, namespaced by model
+    Keys are content hashes, so rows are only ever inserted, never
+    rewritten; `last_used` is stamped for the keys a run touched and
+    compact() drops the ones no run has needed for a while.
+    """
+
+    def __init__(self, path: str, namespace: str = "", batch_size: int = 256):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        # Different embedding models must never share cached vectors
+        self._namespace = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:8]
+        self._lock = threading.Lock()
+        # Several ingest worker processes may write at once; wait for the lock
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for table in TABLES:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+        self._conn.commit()
+
+        self._pending: dict[str, list[tuple[str, bytes, float]]] = {table: [] for table in TABLES}
+        self._touched: dict[str, set[str]] = {table: set() for table in TABLES}
+        self._counters = {table: {"hits": 0, "misses": 0, "writes": 0} for table in TABLES}
+
+    def _embedding_key(self, key: str) -> str:
+        return f"{self._namespace}:{key}"
+
+    def _get(self, table: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                # Written by this process but not flushed yet
+                row = next(((value,) for k, value, _ in self._pending[table] if k == key), None)
+            counters = self._counters[table]
+            if row is None:
+                counters["misses"] += 1
+                return None
+            counters["hits"] += 1
+            self._touched[table].add(key)
+            return row[0]
+
+    def _put(self, table: str, key: str, value: bytes):
+        with self._lock:
+            self._pending[table].append((key, value, time.time()))
+            self._counters[table]["writes"] += 1
+            if len(self._pending[table]) >= self.batch_size:
+                self._write_pending()
+
+    def _write_pending(self):
+        for table, rows in self._pending.items():
+            if rows:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO {table} (key, value, last_used) VALUES (?, ?, ?)", rows
+                )
+                rows.clear()
+        self._conn.commit()
+
+    def has_nodes(self, key: str) -> bool:
+        """Cheap existence check; a miss is counted here, a hit by get_nodes()"""
+        with self._lock:
+            found = any(k == key for k, _, _ in self._pending["nodes"]) or self._conn.execute(
+                "SELECT 1 FROM nodes WHERE key = ?", (key,)
+            ).fetchone() is not None
+            if not found:
+                self._counters["nodes"]["misses"] += 1
+            return found
+
+    def get_nodes(self, key: str) -> Optional[list[BaseNode]]:
+        value = self._get("nodes", key)
+        if value is None:
+            return None
+        return [json_to_doc(record) for record in json.loads(zlib.decompress(value))]
+
+    def put_nodes(self, key: str, nodes: list[BaseNode]):
+        records = [doc_to_json(node) for node in nodes]
+        for record in records:
+            # Embeddings live in their own table
+            record[DATA_KEY]["embedding"] = None
+        self._put("nodes", key, zlib.compress(json.dumps(records, ensure_ascii=False).encode("utf-8")))
+
+    def get_embedding(self, key: str) -> Optional[np.ndarray]:
+        value = self._get("embeddings", self._embedding_key(key))
+        return np.frombuffer(value, dtype=np.float32) if value is not None else None
+
+    def put_embedding(self, key: str, vector: np.ndarray):
+        self._put("embeddings", self._embedding_key(key), np.asarray(vector, dtype=np.float32).tobytes())
+
+    def flush(self):
+        """Write pending rows and stamp the keys read since the last flush"""
+        with self._lock:
+            self._write_pending()
+            now = time.time()
+            for table, keys in self._touched.items():
+                if keys:
+                    self._conn.executemany(
+                        f"UPDATE {table} SET last_used = ? WHERE key = ?", [(now, key) for key in keys]
+                    )
+                    keys.clear()
+            self._conn.commit()
+
+    def compact(self, max_age_days: float) -> dict:
+        """Delete entries unused for `max_age_days` and give the space back to the filesystem"""
+        self.flush()
+        before = self.size_bytes()
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            deleted = {
+                table: self._conn.execute(f"DELETE FROM {table} WHERE last_used < ?", (cutoff,)).rowcount
+                for table in TABLES
+            }
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"deleted": deleted, "size_before": before, "size_after": self.size_bytes()}
+
+    def size_bytes(self) -> int:
+        return sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ("", "-wal")
+            if os.path.exists(self.path + suffix)
+        )
+
+    def take_counters(self) -> dict[str, dict[str, int]]:
+        """Return hit/miss/write counters and reset them"""
+        with self._lock:
+            counters = self._counters
+            self._counters = {table: {"hits": 0, "misses": 0, "writes": 0} for table in TABLES}
+            return counters
+
+    def merge_counters(self, counters: dict[str, dict[str, int]]):
+        """Add counters taken from another connection (e.g. an ingest worker process)"""
+        with self._lock:
+            for table, counts in counters.items():
+                for name, value in counts.items():
+                    self._counters[table][name] += value
+
+    def stats(self) -> dict:
+        self.flush()
+        with self._lock:
+            tables = {}
+            for table in TABLES:
+                counts = self._counters[table]
+                lookups = counts["hits"] + counts["misses"]
+                tables[table] = dict(
+                    counts,
+                    entries=self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+                    hit_rate=round(counts["hits"] / lookups, 4) if lookups else 0.0,
+                )
+        return {"path": self.path, "size_bytes": self.size_bytes(), "tables": tables}
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,202 @@
+import os
+import json
+import shutil
+import hashlib
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from llama_index.core.constants import DATA_KEY
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_documents(docs_dir: str, extensions: Iterable[str]) -> dict[str, str]:
+    """Content hash of every supported file under `docs_dir`, keyed by path relative to it"""
+    extensions = tuple(ext.lower() for ext in extensions)
+    files = {}
+    for root, dirs, names in os.walk(docs_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.startswith(".") or not name.lower().endswith(extensions):
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, docs_dir).replace(os.sep, "/")] = file_sha256(path)
+    return files
+
+
+def stable_node_id(rel_path: str, text: str, seen: dict[str, int]) -> str:
+    """
+    Node ID derived from the file and the node text, so an unchanged chunk
+    keeps its ID across ingests; `seen` numbers repeated chunks of one file.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    occurrence = seen.get(text_hash, 0)
+    seen[text_hash] = occurrence + 1
+    digest = hashlib.sha256(f"{rel_path}\0{text_hash}\0{occurrence}".encode("utf-8")).hexdigest()
+    return f"{digest[:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:32]}"
+
+
+class IngestManifest:
+    """
+    What the last ingest produced: content hash and node IDs of every file,
+    plus the settings the nodes depend on. Saved atomically (JSON).
+    """
+
+    def __init__(self, path: str, signature: Optional[dict] = None, files: Optional[dict] = None):
+        self.path = path
+        self.signature = signature or {}
+        self.files: dict[str, dict] = files or {}
+
+    @classmethod
+    def load(cls, path: str) -> "IngestManifest":
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print("Ingest manifest unreadable, ingesting from scratch:", e)
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, signature=data.get("signature"), files=data.get("files"))
+
+    def node_ids(self, rel_path: str) -> list[str]:
+        return self.files.get(rel_path, {}).get("node_ids", [])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "signature": self.signature, "files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class IngestCheckpoint:
+    """
+    Progress of the running ingest, saved after every committed batch so a
+    crashed run resumes where it stopped. Nodes written by the run are
+    staged per file (node JSON lines + raw float32 embeddings); the BM25
+    index is built from them at the end, then the directory is removed.
+    """
+
+    def __init__(self, directory: str, signature: dict, rebuild: bool):
+        self.directory = directory
+        self.path = os.path.join(directory, "checkpoint.json")
+        self.signature = signature
+        self.rebuild = rebuild
+        self.files: dict[str, dict] = {}
+
+    @classmethod
+    def resume(cls, directory: str, signature: dict) -> Optional["IngestCheckpoint"]:
+        """Checkpoint of an interrupted run with the same settings, if any"""
+        try:
+            with open(os.path.join(directory, "checkpoint.json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("signature") != signature:
+            return None
+        checkpoint = cls(directory, signature, data["rebuild"])
+        checkpoint.files = data["files"]
+        return checkpoint
+
+    def _staged(self, rel_path: str, suffix: str) -> str:
+        name = hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{name}.{suffix}")
+
+    def start_file(self, rel_path: str, sha256: str) -> dict:
+        """
+        Progress of `rel_path`, continued if the file is unchanged since the
+        interrupted run (vectors that run committed for an older version of
+        the file are left for the final prune of the collection).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        state = self.files.get(rel_path)
+        if state is not None and state["sha256"] != sha256:
+            state = None
+        if state is None:
+            state = {"sha256": sha256, "nodes": 0, "records_bytes": 0, "embeddings_bytes": 0, "done": False}
+            self.files[rel_path] = state
+
+        # Drop anything written after the last committed batch
+        for suffix, size in (("jsonl", state["records_bytes"]), ("f32", state["embeddings_bytes"])):
+            with open(self._staged(rel_path, suffix), "ab") as f:
+                f.truncate(size)
+        self.save()
+        return state
+
+    def append(self, rel_path: str, nodes: list):
+        """Stage a batch of embedded nodes and commit it"""
+        state = self.files[rel_path]
+        with open(self._staged(rel_path, "jsonl"), "ab") as records, open(self._staged(rel_path, "f32"), "ab") as vectors:
+            for node in nodes:
+                record = doc_to_json(node)
+                record[DATA_KEY]["embedding"] = None
+                records.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                vectors.write(np.asarray(node.embedding, dtype=np.float32).tobytes())
+            for f in (records, vectors):
+                f.flush()
+                os.fsync(f.fileno())
+            state["records_bytes"] = records.tell()
+            state["embeddings_bytes"] = vectors.tell()
+        state["nodes"] += len(nodes)
+        self.save()
+
+    def finish_file(self, rel_path: str):
+        self.files[rel_path]["done"] = True
+        self.save()
+
+    def discard_file(self, rel_path: str) -> list[str]:
+        """Forget the staged nodes of `rel_path`; returns their IDs"""
+        node_ids = self.node_ids(rel_path)
+        del self.files[rel_path]
+        for suffix in ("jsonl", "f32"):
+            if os.path.exists(self._staged(rel_path, suffix)):
+                os.remove(self._staged(rel_path, suffix))
+        self.save()
+        return node_ids
+
+    def iter_nodes(self, rel_path: str) -> Iterator[BaseNode]:
+        """Staged nodes of `rel_path` with their embeddings, read one at a time"""
+        state = self.files[rel_path]
+        if not state["nodes"]:
+            return
+        vectors = np.memmap(self._staged(rel_path, "f32"), dtype=np.float32, mode="r")
+        vectors = vectors[:state["embeddings_bytes"] // 4].reshape(state["nodes"], -1)
+        with open(self._staged(rel_path, "jsonl"), "rb") as f:
+            for i in range(state["nodes"]):
+                node = json_to_doc(json.loads(f.readline()))
+                node.embedding = vectors[i].tolist()
+                yield node
+
+    def node_ids(self, rel_path: str) -> list[str]:
+        state = self.files.get(rel_path)
+        if not state or not state["nodes"]:
+            return []
+        with open(self._staged(rel_path, "jsonl"), "rb") as f:
+            return [json.loads(f.readline())[DATA_KEY]["id_"] for _ in range(state["nodes"])]
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "signature": self.signature,
+                "rebuild": self.rebuild,
+                "files": self.files,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
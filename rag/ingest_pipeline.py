@@ -1,25 +1,52 @@
 import os
+import json
 import asyncio
+import math
+import hashlib
 import time
-import pickle
-from llama_index.core import SimpleDirectoryReader
-from llama_index.core.ingestion import IngestionPipeline, IngestionCache
+import shutil
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+from llama_index.core import Document, SimpleDirectoryReader
+from llama_index.core.ingestion import IngestionPipeline
 from llama_index.core.node_parser import SemanticSplitterNodeParser
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.extractors import SummaryExtractor
+from llama_index.core.schema import BaseNode, MetadataMode
+from rag.bm25_index import NodeStore, build_bm25_index
+from rag.embedding_cache import StageEmbedding, TextEmbeddingMemo
+from rag.ingest_cache import SQLiteIngestCache
+from rag.index_builder import (
+    create_embed_model,
+    get_embed_model,
+    prune_collection,
+    sync_index,
+    open_ingest_collection,
+    activate_collection,
+)
+from rag.ingest_manifest import IngestCheckpoint, IngestManifest, scan_documents, stable_node_id
 from rag.global_settings import (
-    FILES_PATH,
-    CACHE_FILE,
-    NODES_FILE,
+    DOCS_DIR,
+    DOC_EXTENSIONS,
+    INGEST_CACHE_DB,
+    BM25_INDEX_DIR,
+    INGEST_MANIFEST_FILE,
     EMBEDDING_MODEL_NAME,
-    init_llm_settings,
+    SPLITTER_BUFFER_SIZE,
+    SPLITTER_BREAKPOINT_PERCENTILE,
+    INGEST_SHARD_CHARS,
+    INGEST_WORKERS,
+    EMBED_BATCH_SIZE,
+    INGEST_BATCH_SIZE,
+    INGEST_STAGING_DIR,
+    CHROMA_HNSW_SPACE,
+    CHROMA_HNSW_M,
+    CHROMA_HNSW_EF_CONSTRUCTION,
 )
 
-os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-os.makedirs(os.path.dirname(NODES_FILE), exist_ok=True)
-
-init_llm_settings()
-
 class SequentialSummaryExtractor(SummaryExtractor):
     """SummaryExtractor that runs sequentially with rate limiting."""
     def __init__(self, rate_per_minute: int = 30, **kwargs):
@@ -39,53 +66,392 @@ class SequentialSummaryExtractor(SummaryExtractor):
             results.extend(res)
         return results
 
-def ingest_documents():
-    print("Loading documents...")
-    documents = SimpleDirectoryReader(input_files=FILES_PATH).load_data()
+@dataclass
+class IngestResult:
+    """What an ingest run changed (paths are relative to DOCS_DIR)"""
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    upserted_nodes: int = 0
+    deleted_nodes: int = 0
+    total_nodes: int = 0
+    cache_stats: Optional[dict] = None
+
+    @property
+    def up_to_date(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+def pipeline_signature() -> dict:
+    """Settings the stored nodes depend on; any change re-ingests everything"""
+    return {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "splitter_buffer_size": SPLITTER_BUFFER_SIZE,
+        "splitter_breakpoint_percentile": SPLITTER_BREAKPOINT_PERCENTILE,
+        "shard_chars": INGEST_SHARD_CHARS,
+        # Fixed when the Chroma collection is created; ef_search is not
+        "chroma_hnsw": [CHROMA_HNSW_SPACE, CHROMA_HNSW_M, CHROMA_HNSW_EF_CONSTRUCTION],
+    }
+
+def _open_node_store() -> Optional[NodeStore]:
+    try:
+        return NodeStore(BM25_INDEX_DIR)
+    except (OSError, ValueError):
+        return None
+
+def _iter_stored_nodes(store: NodeStore, node_ids: list[str]) -> Iterator[BaseNode]:
+    for node_id in node_ids:
+        node = store.get_by_id(node_id)
+        node.embedding = store.get_embedding(node_id).tolist()
+        yield node
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def load_file(rel_path: str) -> list[Document]:
+    """Load one file under DOCS_DIR (one Document per page for PDFs)"""
+    return SimpleDirectoryReader(
+        input_files=[os.path.join(DOCS_DIR, rel_path)],
+        filename_as_id=True,
+    ).load_data()
+
+def shard_documents(documents: list[Document], max_chars: int = INGEST_SHARD_CHARS) -> list[list[Document]]:
+    """
+    Group a file's documents (pages) into shards of about `max_chars`.
+    A longer document (e.g. a whole .docx) is cut at line breaks into
+    parts with the same metadata. Shards depend only on the text, never
+    on the number of workers, so every run yields the same nodes.
+    """
+    parts = []
+    for document in documents:
+        text = document.text
+        if len(text) <= max_chars:
+            parts.append(document)
+            continue
+        start = 0
+        while start < len(text):
+            end = len(text) if len(text) - start <= max_chars else text.rfind("\n", start, start + max_chars) + 1
+            if end <= start:
+                end = start + max_chars
+            parts.append(Document(
+                id_=f"{document.doc_id}#{len(parts)}",
+                text=text[start:end],
+                metadata=dict(document.metadata),
+                excluded_embed_metadata_keys=list(document.excluded_embed_metadata_keys),
+                excluded_llm_metadata_keys=list(document.excluded_llm_metadata_keys),
+            ))
+            start = end
+
+    shards, size = [], 0
+    for part in parts:
+        if shards and size + len(part.text) <= max_chars:
+            shards[-1].append(part)
+            size += len(part.text)
+        else:
+            shards.append([part])
+            size = len(part.text)
+    return shards
+
+def _shard_cache_key(shard: list[Document], signature: dict) -> str:
+    # The split result does not depend on the vector index parameters
+    split_settings = {key: value for key, value in signature.items() if key != "chroma_hnsw"}
+    h = hashlib.sha256(json.dumps(split_settings, sort_keys=True).encode("utf-8"))
+    for document in shard:
+        h.update(document.get_content(metadata_mode=MetadataMode.ALL).encode("utf-8"))
+    return h.hexdigest()
+
+def _iter_file_nodes(executor: "IngestExecutor", cache: SQLiteIngestCache, signature: dict, rel_path: str) -> Iterator[BaseNode]:
+    """Nodes of one file, in order, with stable IDs; shards are split lazily (cached ones read from disk)"""
+    shards = shard_documents(load_file(rel_path))
+    keys = [_shard_cache_key(shard, signature) for shard in shards]
+    pending = [i for i, key in enumerate(keys) if not cache.has_nodes(key)]
+    print(f"{rel_path}: {len(shards)} shards ({len(shards) - len(pending)} cached)")
+    split = executor.split(shards[i] for i in pending)
+
+    pending = set(pending)
+    seen: dict[str, int] = {}
+    for i, key in enumerate(keys):
+        if i in pending:
+            nodes = next(split)
+            cache.put_nodes(key, nodes)
+        else:
+            nodes = cache.get_nodes(key)
+        shards[i] = None
+        for node in nodes:
+            node.id_ = stable_node_id(rel_path, node.get_content(metadata_mode=MetadataMode.NONE), seen)
+            yield node
+
+# Set in ingest worker processes only; the parent process uses get_embed_model()
+_worker_model = None
+_worker_memo: Optional[TextEmbeddingMemo] = None
+_worker_cache: Optional[SQLiteIngestCache] = None
+
+def _init_worker(torch_threads: int, cache_path: Optional[str]):
+    global _worker_model, _worker_memo, _worker_cache
 
     try:
-        cache = IngestionCache.from_persist_path(CACHE_FILE)
-        print("Cache file found. Using existing cache.")
-    except Exception:
-        cache = None
-        print("No cache file found. Creating a new pipeline.")
+        import torch
+        # Workers share the cores instead of each using all of them
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    if cache_path:
+        _worker_cache = SQLiteIngestCache(cache_path, namespace=EMBEDDING_MODEL_NAME)
+    _worker_memo = TextEmbeddingMemo(store=_worker_cache)
+    _worker_model = create_embed_model()
 
-    embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL_NAME)
+def _model():
+    return _worker_model if _worker_model is not None else get_embed_model()
 
+def _run_in_worker(task: Callable, payload) -> tuple[object, dict, dict]:
+    result = task(payload, _worker_memo)
+    if _worker_cache is None:
+        return result, _worker_memo.take_counts(), {}
+    _worker_cache.flush()
+    return result, _worker_memo.take_counts(), _worker_cache.take_counters()
+
+def _split_shard(documents: list[Document], memo: TextEmbeddingMemo) -> list[BaseNode]:
     semantic_parser = SemanticSplitterNodeParser(
-        buffer_size=1,
-        breakpoint_percentile_threshold=95,
-        embed_model=embed_model,
+        buffer_size=SPLITTER_BUFFER_SIZE,
+        breakpoint_percentile_threshold=SPLITTER_BREAKPOINT_PERCENTILE,
+        embed_model=StageEmbedding(_model(), "semantic_splitter", memo),
     )
 
     pipeline = IngestionPipeline(
         transformations=[
             semantic_parser,
             # SequentialSummaryExtractor(rate_per_minute=30, summaries=["self"]),
-            embed_model,
         ],
-        cache=cache,
     )
+    return pipeline.run(documents=documents)
+
+def _embed_batch(texts: list[str], memo: TextEmbeddingMemo) -> list[list[float]]:
+    stage_model = StageEmbedding(_model(), "node_embedding", memo)
+    return stage_model.get_text_embedding_batch(texts)
+
+class IngestExecutor:
+    """
+    Runs the CPU-bound ingest work (semantic splitting, node embedding)
+    in this process, or with `workers` > 1 in a pool of processes that
+    each load the embedding model once. Results keep the input order.
+    """
+
+    def __init__(self, workers: int, memo: TextEmbeddingMemo):
+        self.workers = max(1, workers)
+        self.memo = memo
+        # Workers open their own connection to the memo's on-disk store
+        self.cache: Optional[SQLiteIngestCache] = memo.store
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "IngestExecutor":
+        if self.workers > 1:
+            # spawn: forking a process that already loaded torch is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    max(1, (os.cpu_count() or 1) // self.workers),
+                    self.cache.path if self.cache is not None else None,
+                ),
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _imap(self, task: Callable, payloads: Iterable) -> Iterator:
+        """Results in input order; at most 2 tasks per worker in flight (backpressure)"""
+        if self._pool is None:
+            for payload in payloads:
+                yield task(payload, self.memo)
+            return
+
+        payloads = iter(payloads)
+        in_flight = deque(
+            self._pool.submit(_run_in_worker, task, payload) for payload in islice(payloads, self.workers * 2)
+        )
+        while in_flight:
+            result, counts, cache_counters = in_flight.popleft().result()
+            for payload in islice(payloads, 1):
+                in_flight.append(self._pool.submit(_run_in_worker, task, payload))
+            self.memo.merge_counts(counts)
+            if self.cache is not None:
+                self.cache.merge_counters(cache_counters)
+            yield result
+
+    def split(self, shards: Iterable[list[Document]]) -> Iterator[list[BaseNode]]:
+        return self._imap(_split_shard, shards)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[Optional[list[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+        if self._pool is not None:
+            # Cached vectors are read here instead of starting workers for them
+            for i in pending:
+                cached = self.memo.get(self.memo.key(texts[i]))
+                if cached is not None:
+                    vectors[i] = cached.tolist()
+            pending = [i for i in pending if vectors[i] is None]
+            self.memo.record("node_embedding", requested=len(texts) - len(pending))
+
+        # Spread a batch over the workers, several model batches per task at most
+        step = min(EMBED_BATCH_SIZE * 4, max(1, math.ceil(len(pending) / self.workers)))
+        batches = [[texts[i] for i in pending[j:j + step]] for j in range(0, len(pending), step)]
+        computed = (vector for batch in self._imap(_embed_batch, batches) for vector in batch)
+        for i, vector in zip(pending, computed):
+            vectors[i] = vector
+        return vectors
+
+def ingest_documents(
+    memo: Optional[TextEmbeddingMemo] = None,
+    full: bool = False,
+    workers: Optional[int] = None,
+) -> IngestResult:
+    """
+    Incrementally ingest every document under DOCS_DIR.
+    Files are compared by content hash with the manifest of the last run;
+    only added or changed files are processed. Node IDs are stable (file +
+    node text), so unchanged nodes of a changed file keep their stored
+    embedding. With `full`, every file is re-ingested and the collection
+    rebuilt.
+    Processing streams: read → split → embed → upsert to Chroma and stage
+    on disk, INGEST_BATCH_SIZE nodes at a time, with shards split and
+    embedded by `workers` processes (INGEST_WORKERS by default). Memory
+    holds one file's documents and one batch of nodes, not the corpus.
+    Every batch is checkpointed; after a crash the next run resumes after
+    the last committed batch. The BM25 index is built at the end from the
+    stored and staged nodes (streamed, swapped in atomically), then the
+    manifest is saved.
+    """
+    memo = memo or TextEmbeddingMemo()
+    manifest = IngestManifest.load(INGEST_MANIFEST_FILE)
+    store = _open_node_store()
+    signature = pipeline_signature()
+
+    checkpoint = IngestCheckpoint.resume(INGEST_STAGING_DIR, signature)
+    if manifest.files and manifest.signature != signature:
+        print("Ingestion settings changed since the last run, re-ingesting everything.")
+    rebuild = full or not manifest.files or manifest.signature != signature
+    if checkpoint is not None:
+        print(f"Resuming the interrupted ingest from {INGEST_STAGING_DIR}")
+        # An interrupted rebuild left its collection partly refreshed: finish it
+        rebuild = rebuild or checkpoint.rebuild
+    else:
+        shutil.rmtree(INGEST_STAGING_DIR, ignore_errors=True)
+        checkpoint = IngestCheckpoint(INGEST_STAGING_DIR, signature, rebuild)
+
+    print(f"Scanning {DOCS_DIR}...")
+    files = scan_documents(DOCS_DIR, DOC_EXTENSIONS)
+
+    result = IngestResult()
+    result.removed = sorted(set(manifest.files) - set(files))
+    for rel_path, sha256 in files.items():
+        previous = manifest.files.get(rel_path)
+        if previous is None:
+            result.added.append(rel_path)
+        elif rebuild or previous["sha256"] != sha256:
+            result.changed.append(rel_path)
+        elif store is None or any(node_id not in store.index_of for node_id in previous["node_ids"]):
+            # Manifest and BM25 data disagree (e.g. data/bm25 deleted): redo the file
+            result.changed.append(rel_path)
+        else:
+            result.unchanged.append(rel_path)
+
+    print(f"Documents: {len(result.added)} added, {len(result.changed)} changed, "
+          f"{len(result.removed)} removed, {len(result.unchanged)} unchanged")
+
+    # The active collection, or a new one if the HNSW parameters changed
+    collection = open_ingest_collection(rebuild)
+
+    # Files the interrupted run wrote but that need no processing now
+    # (reverted or deleted since): their committed vectors are orphaned
+    to_process = set(result.added + result.changed)
+    orphaned = False
+    for rel_path in [p for p in checkpoint.files if p not in to_process]:
+        orphaned = bool(checkpoint.discard_file(rel_path)) or orphaned
+
+    if result.up_to_date and not rebuild:
+        result.total_nodes = sum(len(manifest.node_ids(p)) for p in files)
+        if orphaned:
+            keep_ids = [node_id for rel_path in files for node_id in manifest.node_ids(rel_path)]
+            result.deleted_nodes += prune_collection(keep_ids, memo, collection)["deleted"]
+        checkpoint.clear()
+        print("Corpus unchanged, nothing to ingest.")
+        return result
+
+    # Split results and embeddings of earlier runs, read per key
+    cache = SQLiteIngestCache(INGEST_CACHE_DB, namespace=EMBEDDING_MODEL_NAME)
+    memo.store = cache
+
+    with IngestExecutor(workers or INGEST_WORKERS, memo) as executor:
+        print(f"Processing with {executor.workers} worker(s), {INGEST_BATCH_SIZE} nodes per batch")
+        for rel_path in result.added + result.changed:
+            state = checkpoint.start_file(rel_path, files[rel_path])
+            if state["done"]:
+                print(f"{rel_path}: done in the interrupted run")
+                continue
+
+            # Nodes committed before an interruption are regenerated (cheap:
+            # the shard cache) but not embedded or written again
+            nodes = islice(_iter_file_nodes(executor, cache, signature, rel_path), state["nodes"], None)
+            for batch in _batched(nodes, INGEST_BATCH_SIZE):
+                for node in batch:
+                    stored = store.get_embedding(node.node_id) if store is not None and not rebuild else None
+                    if stored is not None:
+                        node.embedding = stored.tolist()
+
+                # Only nodes that are new since the last run get embedded
+                missing = [node for node in batch if node.embedding is None]
+                embeddings = executor.embed([node.get_content(metadata_mode=MetadataMode.EMBED) for node in missing])
+                for node, embedding in zip(missing, embeddings):
+                    node.embedding = embedding
+                memo.record("node_embedding", precomputed=len(batch) - len(missing))
+
+                sync_index(batch, memo=memo, collection=collection)
+                checkpoint.append(rel_path, batch)
+                result.upserted_nodes += len(batch)
+            checkpoint.finish_file(rel_path)
+
+    # Prebuilt BM25 index + node text for the API process, in file order,
+    # streamed from the previous index (unchanged files) and the staging area
+    def corpus() -> Iterator[BaseNode]:
+        for rel_path in sorted(files):
+            if rel_path in checkpoint.files:
+                yield from checkpoint.iter_nodes(rel_path)
+            else:
+                yield from _iter_stored_nodes(store, manifest.node_ids(rel_path))
+
+    meta = build_bm25_index(corpus(), BM25_INDEX_DIR)
+    print(f"BM25 index saved to {BM25_INDEX_DIR}")
+
+    node_ids = {
+        rel_path: checkpoint.node_ids(rel_path) if rel_path in checkpoint.files else manifest.node_ids(rel_path)
+        for rel_path in sorted(files)
+    }
+    # Only now that every new vector is in place: drop the ones of older
+    # file versions, removed files and interrupted runs
+    keep_ids = [node_id for ids in node_ids.values() for node_id in ids]
+    result.deleted_nodes += prune_collection(keep_ids, memo, collection)["deleted"]
+    activate_collection(collection)
+
+    manifest.signature = signature
+    manifest.files = {
+        rel_path: {"sha256": files[rel_path], "node_ids": node_ids[rel_path]}
+        for rel_path in sorted(files)
+    }
+    manifest.save()
+    checkpoint.clear()
+
+    result.cache_stats = cache.stats()
+    memo.store = None
+    cache.close()
 
-    nodes = pipeline.run(documents=documents)
-    pipeline.cache.persist(CACHE_FILE)
-    
-    # Save nodes to pickle file for BM25 retrieval
-    with open(NODES_FILE, "wb") as f:
-        pickle.dump(nodes, f)
-    print(f"Nodes saved to {NODES_FILE}")
-    
-    print(f"Created {len(nodes)} nodes from DSM-5 documents.")
-    return nodes
-
-
-def load_nodes():
-    """Load nodes from pickle file for BM25 retrieval"""
-    if not os.path.exists(NODES_FILE):
-        raise FileNotFoundError(f"Nodes file not found: {NODES_FILE}. Please run ingestion first.")
-    
-    with open(NODES_FILE, "rb") as f:
-        nodes = pickle.load(f)
-    
-    print(f"Loaded {len(nodes)} nodes from {NODES_FILE}")
-    return nodes
\ No newline at end of file
+    result.total_nodes = meta["num_docs"]
+    print(f"{result.total_nodes} nodes from {len(files)} documents "
+          f"({result.upserted_nodes} upserted, {result.deleted_nodes} deleted).")
+    return result
@@ -1,14 +1,53 @@
 import uuid
 from typing import Optional
 from llama_index.core.memory import Memory
+from llama_index.core.storage.chat_store.sql import MessageStatus
+from rag.session_store import SessionStore, SessionEntry
+from rag.history_store import HistoryBackend, HistoryConflict, SQLiteHistoryBackend
 from rag.global_settings import (
     TOKEN_LIMIT,
     TOKEN_FLUSH_SIZE,
     CHAT_HISTORY_TOKEN_RATIO,
+    MAX_SESSIONS,
+    SESSION_IDLE_TTL,
+    SESSION_SWEEP_INTERVAL,
+    SESSION_DIR,
+    HISTORY_SHARDS,
 )
 
-# Cache memories by session_id
-_memory_cache: dict[str, Memory] = {}
+# Bounded store of live session memories by session_id
+_session_store: Optional[SessionStore] = None
+# Persistent chat history shared by all workers
+_history_backend: Optional[HistoryBackend] = None
+
+def get_session_store() -> SessionStore:
+    """Get or create the session store and start its idle sweeper"""
+    global _session_store
+    
+    if _session_store is not None:
+        return _session_store
+    
+    _session_store = SessionStore(
+        max_sessions=MAX_SESSIONS,
+        idle_ttl=SESSION_IDLE_TTL,
+    )
+    _session_store.start_sweeper(SESSION_SWEEP_INTERVAL)
+    return _session_store
+
+def get_history_backend() -> HistoryBackend:
+    """Get or create the persistent chat history backend"""
+    global _history_backend
+    
+    if _history_backend is not None:
+        return _history_backend
+    
+    _history_backend = SQLiteHistoryBackend(SESSION_DIR, shards=HISTORY_SHARDS)
+    return _history_backend
+
+def set_history_backend(backend: HistoryBackend):
+    """Plug in a different history backend (e.g. a shared database)"""
+    global _history_backend
+    _history_backend = backend
 
 def create_memory(session_id: str) -> Memory:
     """
@@ -24,31 +63,115 @@ def create_memory(session_id: str) -> Memory:
     
     return memory
 
-def get_memory(session_id: Optional[str] = None) -> tuple[Memory, str]:
+def get_session(session_id: Optional[str] = None) -> tuple[SessionEntry, str]:
     """
-    Get or create a Memory instance for a session
+    Get or create the session entry for a session
     """
+    store = get_session_store()
+    
     # Generate new session_id if not provided
     if session_id is None:
         session_id = str(uuid.uuid4())
     
-    # Return cached memory if exists
-    if session_id in _memory_cache:
-        return _memory_cache[session_id], session_id
+    # Return live session if exists
+    entry = store.get(session_id)
+    if entry is not None:
+        return entry, session_id
     
-    # Create new memory for this session
-    memory = create_memory(session_id)
-    _memory_cache[session_id] = memory
+    # Create new (or recreate evicted) session; history is loaded lazily
+    entry = SessionEntry(memory=create_memory(session_id))
+    store.put(session_id, entry)
     
     print(f"Memory created for session: {session_id}")
-    return memory, session_id
+    return entry, session_id
 
-def clear_memory(session_id: str) -> bool:
+def get_memory(session_id: Optional[str] = None) -> tuple[Memory, str]:
+    """
+    Get or create a Memory instance for a session
+    """
+    entry, session_id = get_session(session_id)
+    return entry.memory, session_id
+
+async def ensure_history_loaded(session_id: str, entry: SessionEntry):
+    """
+    Sync a live Memory with the persisted history before a turn.
+    Loads lazily on first access and reloads if another worker has
+    appended turns since, so sessions need no sticky routing.
+    """
+    backend = get_history_backend()
+    count = await backend.acount(session_id)
+    
+    if entry.persisted_count == count:
+        return
+    
+    if count == 0 and entry.persisted_count is None:
+        # Brand-new session, nothing to restore
+        entry.persisted_count = 0
+        return
+    
+    messages = await backend.aload(session_id)
+    # aput_messages() archives the oldest turns that exceed token_limit,
+    # as they would have been in a live session (aset() keeps all active)
+    await entry.memory.areset()
+    if messages:
+        await entry.memory.aput_messages(messages)
+    entry.persisted_count = len(messages)
+    entry.history_bytes = _history_size(messages)
+    if messages:
+        print(f"Loaded {len(messages)} messages for session: {session_id}")
+
+async def persist_memory(session_id: str, entry: SessionEntry):
+    """
+    Append the new messages of a completed turn to the history backend
+    """
+    backend = get_history_backend()
+    messages = await entry.memory.aget_all()
+    known = entry.persisted_count or 0
+    
+    if len(messages) >= known:
+        try:
+            entry.persisted_count = await backend.aappend(session_id, messages[known:], start=known)
+        except HistoryConflict:
+            # Another worker stored a turn of this session meanwhile: keep
+            # this turn whole after it, then reload memory from the store
+            print(f"Concurrent turn in session {session_id}, reloading its history")
+            await backend.aappend(session_id, messages[known:])
+            entry.persisted_count = None
+            await ensure_history_loaded(session_id, entry)
+            return
+    else:
+        # History shrank (e.g. memory was reset) → rewrite it
+        entry.persisted_count = await backend.areplace(session_id, messages)
+    entry.history_bytes = _history_size(messages)
+
+def _history_size(messages) -> int:
+    return sum(len(str(m.content or "").encode("utf-8")) for m in messages)
+
+async def snapshot_memory(memory: Memory) -> tuple[list, list]:
+    """Archived and active messages of a Memory, for restore_memory()"""
+    archived = await memory.aget_all(status=MessageStatus.ARCHIVED)
+    active = await memory.aget_all(status=MessageStatus.ACTIVE)
+    return archived, active
+
+async def restore_memory(memory: Memory, snapshot: tuple[list, list]):
+    """
+    Put a Memory back to a snapshot, each message with the status it had
+    (aset() would make every message active again)
+    """
+    archived, active = snapshot
+    await memory.areset()
+    for messages, status in ((archived, MessageStatus.ARCHIVED), (active, MessageStatus.ACTIVE)):
+        if messages:
+            await memory.sql_store.add_messages(memory.session_id, messages, status=status)
+
+async def clear_memory(session_id: str) -> bool:
     """
     Clear memory for a specific session
     """
-    if session_id in _memory_cache:
-        del _memory_cache[session_id]
+    removed = get_session_store().remove(session_id)
+    deleted = await get_history_backend().adelete(session_id)
+    
+    if removed or deleted:
         print(f"Memory cleared for session: {session_id}")
         return True
     return False
@@ -57,8 +180,7 @@ def clear_all_memories() -> int:
     """
     Clear all cached memories
     """
-    count = len(_memory_cache)
-    _memory_cache.clear()
+    count = get_session_store().clear()
     print(f"Cleared {count} memory sessions.")
     return count
 
@@ -66,4 +188,10 @@ def list_sessions() -> list[str]:
     """
     List all active session IDs
     """
-    return list(_memory_cache.keys())
+    return get_session_store().session_ids()
+
+def session_stats() -> dict:
+    """
+    Size and memory estimate of the session store
+    """
+    return get_session_store().stats()
\ No newline at end of file
@@ -0,0 +1,175 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Optional
+from llama_index.core.schema import MetadataMode, NodeWithScore
+
+RERANK_BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def load_cross_encoder(
+    model_name: str,
+    backend: str = "torch",
+    max_length: int = 512,
+    onnx_file: Optional[str] = None,
+    device: Optional[str] = None,
+) -> Any:
+    """
+    Load a cross-encoder.
+    - torch:      default fp32 CrossEncoder on `device` (None: a GPU if
+                  one is available, else CPU)
+    - torch-int8: dynamic int8 quantization of all Linear layers (CPU only)
+    - onnx:       ONNX Runtime backend on CPU (needs sentence-transformers>=4.1
+                  and optimum[onnxruntime]); `onnx_file` may point to a
+                  quantized export such as "onnx/model_qint8_avx512_vnni.onnx"
+    """
+    from sentence_transformers import CrossEncoder
+
+    if backend not in RERANK_BACKENDS:
+        raise ValueError(f"Unknown rerank backend: {backend}. Expected one of {RERANK_BACKENDS}")
+
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return CrossEncoder(
+            model_name,
+            max_length=max_length,
+            device="cpu",
+            backend="onnx",
+            model_kwargs=model_kwargs,
+        )
+
+    if backend == "torch":
+        return CrossEncoder(model_name, max_length=max_length, device=device)
+
+    # torch-int8: quantized kernels only exist for CPU
+    import torch
+
+    model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+    model.model = torch.quantization.quantize_dynamic(
+        model.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return model
+
+
+class RerankService:
+    """
+    In-process cross-encoder reranking service.
+    Requests from concurrent sessions are queued and scored together by one
+    worker thread: pairs arriving within `batch_window_ms` (up to
+    `max_batch_pairs`) share a single forward pass. Passages are truncated
+    to `max_length` tokens by the tokenizer.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = "torch",
+        max_length: int = 512,
+        batch_window_ms: float = 5.0,
+        max_batch_pairs: int = 64,
+        onnx_file: Optional[str] = None,
+        device: Optional[str] = None,
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.max_length = max_length
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_pairs = max_batch_pairs
+        self.model = load_cross_encoder(model_name, backend, max_length, onnx_file, device)
+
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.pairs = 0
+        self.batches = 0
+
+        self._worker = threading.Thread(target=self._run, name="rerank-service", daemon=True)
+        self._worker.start()
+
+    def score(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Score (query, passage) pairs; blocks until the batch is done."""
+        if not pairs:
+            return []
+        future: Future = Future()
+        self._queue.put((pairs, future))
+        return future.result()
+
+    def rerank(self, query: str, nodes: list[NodeWithScore], top_n: int) -> list[NodeWithScore]:
+        """Same result as SentenceTransformerRerank.postprocess_nodes."""
+        if not nodes:
+            return []
+
+        pairs = [(query, n.node.get_content(metadata_mode=MetadataMode.EMBED)) for n in nodes]
+        scores = self.score(pairs)
+
+        # New NodeWithScore objects: the nodes themselves are shared across requests
+        reranked = [NodeWithScore(node=n.node, score=float(s)) for n, s in zip(nodes, scores)]
+        reranked.sort(key=lambda n: n.score, reverse=True)
+        return reranked[:top_n]
+
+    def _collect(self) -> list[tuple[list[tuple[str, str]], Future]]:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.batch_window
+
+        while size < self.max_batch_pairs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pairs = [pair for item_pairs, _ in batch for pair in item_pairs]
+
+            try:
+                scores = self._predict(pairs)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_pairs, future in batch:
+                future.set_result(scores[offset:offset + len(item_pairs)])
+                offset += len(item_pairs)
+
+            with self._lock:
+                self.requests += len(batch)
+                self.pairs += len(pairs)
+                self.batches += 1
+
+    def _predict(self, pairs: list[tuple[str, str]]) -> list[float]:
+        # Sort by length so each forward pass pads as little as possible
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+        sorted_scores = self.model.predict(
+            [pairs[i] for i in order],
+            batch_size=self.max_batch_pairs,
+            show_progress_bar=False,
+        )
+
+        scores = [0.0] * len(pairs)
+        for rank, i in enumerate(order):
+            scores[i] = float(sorted_scores[rank])
+        return scores
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "max_length": self.max_length,
+                "requests": self.requests,
+                "pairs": self.pairs,
+                "batches": self.batches,
+                "avg_pairs_per_batch": round(self.pairs / self.batches, 2) if self.batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+from llama_index.core.schema import BaseNode, NodeWithScore
+
+# Approximate fixed cost of one cached entry (tuple, list and dict slots)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class RetrievalResultCache:
+    """
+    Cache of hybrid_retrieve_with_fallback results.
+    Stores only node IDs, rerank scores and the fallback flag, keyed by
+    normalized query plus an index fingerprint. Bounded by entry count and
+    bytes; cleared automatically when the index fingerprint changes.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, fingerprint_fn: Callable[[], str]):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fingerprint_fn = fingerprint_fn
+        self._entries: OrderedDict[str, tuple[list[tuple[str, Optional[float]]], bool, int]] = OrderedDict()
+        self._bytes = 0
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_fingerprint(self) -> str:
+        fingerprint = self.fingerprint_fn()
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self.invalidations += 1
+                print("Index changed, retrieval cache invalidated")
+            self._entries.clear()
+            self._bytes = 0
+            self._fingerprint = fingerprint
+        return fingerprint
+
+    def make_key(self, query_norm: str, top_n: int, threshold: float) -> str:
+        with self._lock:
+            fingerprint = self._check_fingerprint()
+        return f"{fingerprint}|{top_n}|{threshold}|{query_norm}"
+
+    def get(
+        self,
+        key: str,
+        lookup: Callable[[str], Optional[BaseNode]],
+    ) -> Optional[tuple[list[NodeWithScore], bool]]:
+        with self._lock:
+            self._check_fingerprint()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        scored_ids, should_fallback, _ = entry
+        nodes = []
+        for node_id, score in scored_ids:
+            node = lookup(node_id)
+            if node is None:
+                # Node no longer resolvable → treat as a miss
+                with self._lock:
+                    self.misses += 1
+                return None
+            nodes.append(NodeWithScore(node=node, score=score))
+
+        with self._lock:
+            self.hits += 1
+        return nodes, should_fallback
+
+    def set(self, key: str, nodes: list[NodeWithScore], should_fallback: bool):
+        scored_ids = [(n.node.node_id, n.score) for n in nodes]
+        size = ENTRY_OVERHEAD_BYTES + len(key.encode("utf-8")) + sum(len(i) + 16 for i, _ in scored_ids)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (scored_ids, should_fallback, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "fingerprint": self._fingerprint,
+            }
+
+
+class FileFingerprint:
+    """Index fingerprint read from a version file, re-read only when it changes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[int] = None
+        self._value = ""
+
+    def __call__(self) -> str:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return ""
+        if mtime != self._mtime:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._value = f.read().strip()
+            self._mtime = mtime
+        return self._value
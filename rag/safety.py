@@ -1,6 +1,22 @@
 import re
+import asyncio
+import hashlib
+import unicodedata
+from collections import deque
+from typing import Optional
 from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.core import Settings
+from rag.verdict_cache import VerdictCache, SQLiteVerdictStore
+from rag.global_settings import (
+    SAFETY_LLM_TIMEOUT,
+    VERDICT_CACHE_SIZE,
+    VERDICT_CACHE_TTL,
+    VERDICT_CACHE_DB,
+    VERDICT_CACHE_DB_MAX_ROWS,
+)
+
+# Cached instance
+_verdict_cache: Optional[VerdictCache] = None
 
 CRISIS_KEYWORDS = [
     r"tự\s*hại",
@@ -102,24 +118,175 @@ WARNING_KEYWORDS = [
     r"nghĩ\s*có\s*chip\s*trong\s*đầu",
 ]
 
+# Compiled regexes kept for reference/benchmarking (see benchmarks/bench_keyword_match.py)
 CRISIS_PATTERNS = [re.compile(p, re.IGNORECASE) for p in CRISIS_KEYWORDS]
 WARNING_PATTERNS = [re.compile(p, re.IGNORECASE) for p in WARNING_KEYWORDS]
 
+_WHITESPACE_RE = re.compile(r"\s+")
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+
 def normalize_text(text: str) -> str:
+    """
+    Lowercase, NFC-compose diacritics and collapse whitespace.
+    Vietnamese keyboards may emit decomposed tone marks (e.g. "ư" + U+0301),
+    which would otherwise never match the precomposed keywords.
+    """
+    text = unicodedata.normalize("NFC", text)
+    text = _ZERO_WIDTH_RE.sub("", text)
     text = text.lower()
-    text = re.sub(r"\s+", " ", text)
+    text = _WHITESPACE_RE.sub(" ", text)
     return text.strip()
 
+def _expand_seq(pattern: str, pos: int) -> tuple[list[str], int]:
+    """Expand a sequence of literals/groups until '|' or ')'."""
+    results = [""]
+    while pos < len(pattern):
+        ch = pattern[pos]
+        if ch in "|)":
+            break
+        if pattern.startswith(r"\s*", pos):
+            # Messages are normalized to single spaces: \s* is "" or " "
+            results = [r + a for r in results for a in ("", " ")]
+            pos += 3
+            continue
+        if ch == "(":
+            alternatives = []
+            pos += 1
+            while True:
+                branch, pos = _expand_seq(pattern, pos)
+                alternatives.extend(branch)
+                if pos >= len(pattern):
+                    raise ValueError(f"Unbalanced group in keyword pattern: {pattern!r}")
+                if pattern[pos] == ")":
+                    pos += 1
+                    break
+                pos += 1  # skip '|'
+            if pos < len(pattern) and pattern[pos] == "?":
+                alternatives.append("")
+                pos += 1
+            results = [r + a for r in results for a in alternatives]
+            continue
+        if ch in "\\[]{}*+?.^$":
+            raise ValueError(f"Unsupported syntax in keyword pattern: {pattern!r}")
+        results = [r + ch for r in results]
+        pos += 1
+    return results, pos
+
+def expand_keyword_pattern(pattern: str) -> tuple[list[str], bool]:
+    r"""
+    Expand a keyword regex into its literal variants, for text normalized
+    by normalize_text() (whitespace collapsed to single spaces).
+    Supports the subset used by CRISIS_KEYWORDS/WARNING_KEYWORDS:
+    literals, \s*, (a|b), optional groups (x)? and a trailing \b.
+    Returns (variants, needs_word_boundary).
+    """
+    needs_boundary = pattern.endswith(r"\b")
+    body = pattern[:-2] if needs_boundary else pattern
+
+    variants, pos = _expand_seq(body, 0)
+    if pos != len(body):
+        raise ValueError(f"Unbalanced group in keyword pattern: {pattern!r}")
+
+    return [v.lower() for v in variants], needs_boundary
+
+class KeywordAutomaton:
+    r"""
+    Aho-Corasick automaton over all keyword patterns.
+    Built once at import; scans a normalized message in a single pass and
+    reports every pattern that occurs (overlapping hits included).
+    Matches exactly what the per-pattern regexes match on normalized text.
+    """
+
+    def __init__(self, pattern_groups: dict[str, list[str]]):
+        # Pattern ids are (group, index) so hits keep the original list order
+        goto: list[dict[str, int]] = [{}]
+        outputs: list[list[tuple[str, int, bool]]] = [[]]
+
+        for group, patterns in pattern_groups.items():
+            for idx, pattern in enumerate(patterns):
+                variants, needs_boundary = expand_keyword_pattern(pattern)
+                for literal in variants:
+                    state = 0
+                    for ch in literal:
+                        nxt = goto[state].get(ch)
+                        if nxt is None:
+                            nxt = len(goto)
+                            goto[state][ch] = nxt
+                            goto.append({})
+                            outputs.append([])
+                        state = nxt
+                    outputs[state].append((group, idx, needs_boundary))
+
+        # BFS to compute failure links and turn goto into a full DFA over the
+        # pattern alphabet; characters outside the alphabet reset to the root.
+        fail = [0] * len(goto)
+        delta: list[dict[str, int]] = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        order = []
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+        for state in order:
+            # Inherit transitions from the failure state (already complete in BFS order)
+            row = dict(delta[fail[state]])
+            row.update(goto[state])
+            delta[state] = row
+
+        self._delta = delta
+        self._outputs = [tuple(out) if out else None for out in outputs]
+        self.groups = list(pattern_groups)
+        self.patterns = pattern_groups
+
+    def scan(self, text_norm: str) -> dict[str, list[str]]:
+        """Return the matched source patterns per group, in definition order."""
+        delta = self._delta
+        outputs = self._outputs
+        hits: set[tuple[str, int]] = set()
+        state = 0
+
+        for pos, ch in enumerate(text_norm):
+            state = delta[state].get(ch, 0)
+            out = outputs[state]
+            if out is None:
+                continue
+            for group, idx, needs_boundary in out:
+                if needs_boundary and not _is_word_boundary(text_norm, pos):
+                    continue
+                hits.add((group, idx))
+
+        return {
+            group: [self.patterns[group][idx] for g, idx in sorted(hits) if g == group]
+            for group in self.groups
+        }
+
+def _is_word_boundary(text: str, pos: int) -> bool:
+    """True if the match ending at pos is followed by a non-word character."""
+    nxt = pos + 1
+    return nxt >= len(text) or not (text[nxt].isalnum() or text[nxt] == "_")
+
+KEYWORD_AUTOMATON = KeywordAutomaton({
+    "crisis": CRISIS_KEYWORDS,
+    "warning": WARNING_KEYWORDS,
+})
+
 def keyword_match(text: str) -> dict:
-    """Detect potential crisis/warning keywords in the message."""
+    """Detect potential crisis/warning keywords in the message (single pass)."""
     text_norm = normalize_text(text)
 
-    crisis_hits = [pat.pattern for pat in CRISIS_PATTERNS if pat.search(text_norm)]
-    warning_hits = [pat.pattern for pat in WARNING_PATTERNS if pat.search(text_norm)]
+    hits = KEYWORD_AUTOMATON.scan(text_norm)
 
     return {
-        "crisis_hits": crisis_hits,
-        "warning_hits": warning_hits,
+        "crisis_hits": hits["crisis"],
+        "warning_hits": hits["warning"],
     }
 
 SAFETY_PROMPT = """
@@ -137,23 +304,101 @@ IMPORTANT: Mild or single neutral statements like "tôi buồn", "tôi chán n
 Return ONLY: CRISIS, WARNING, or SAFE.
 """
 
-def llm_classify(text: str) -> str:
-    """Use LLM to classify message contextually."""
-    llm = Settings.llm
-
-    messages = [
+def _safety_messages(text: str) -> list[ChatMessage]:
+    return [
         ChatMessage(role=MessageRole.SYSTEM, content=SAFETY_PROMPT),
         ChatMessage(role=MessageRole.USER, content=text),
     ]
 
-    res = llm.chat(messages)
-    raw = res.message.content.strip().upper()
-
-    label = re.sub(r"[^A-Z]", "", raw)
+def _parse_label(raw: str) -> Optional[str]:
+    label = re.sub(r"[^A-Z]", "", raw.strip().upper())
 
     if label in ["CRISIS", "WARNING", "SAFE"]:
         return label
-    return "SAFE"
+    return None
+
+def get_verdict_cache() -> VerdictCache:
+    """Get or create the LLM verdict cache"""
+    global _verdict_cache
+
+    if _verdict_cache is not None:
+        return _verdict_cache
+
+    store = None
+    if VERDICT_CACHE_DB:
+        store = SQLiteVerdictStore(VERDICT_CACHE_DB, ttl=VERDICT_CACHE_TTL, max_rows=VERDICT_CACHE_DB_MAX_ROWS)
+    _verdict_cache = VerdictCache(
+        max_size=VERDICT_CACHE_SIZE,
+        ttl=VERDICT_CACHE_TTL,
+        store=store,
+    )
+    return _verdict_cache
+
+def verdict_cache_stats() -> dict:
+    """Hit/miss counters of the verdict cache for monitoring."""
+    return get_verdict_cache().stats()
+
+def _verdict_key(text: str) -> str:
+    """Cache key: prompt+model fingerprint + normalized message."""
+    llm = Settings.llm
+    model = getattr(llm, "model", None) or ""
+    fingerprint = hashlib.sha256(
+        f"{type(llm).__name__}|{model}|{SAFETY_PROMPT}".encode("utf-8")
+    ).hexdigest()[:16]
+    return VerdictCache.make_key(fingerprint, normalize_text(text))
+
+def llm_classify(text: str) -> str:
+    """Use LLM to classify message contextually."""
+    llm = Settings.llm
+    cache = get_verdict_cache()
+    key = _verdict_key(text)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    res = llm.chat(_safety_messages(text))
+    label = _parse_label(res.message.content)
+
+    # Only well-formed answers are cached; unparseable output defaults to SAFE
+    if label is None:
+        return "SAFE"
+    cache.set(key, label)
+    return label
+
+async def llm_classify_async(text: str) -> str:
+    """Async variant of llm_classify using the LLM's async chat API."""
+    llm = Settings.llm
+    cache = get_verdict_cache()
+    key = _verdict_key(text)
+
+    cached = await cache.aget(key)
+    if cached is not None:
+        return cached
+
+    res = await llm.achat(_safety_messages(text))
+    label = _parse_label(res.message.content)
+
+    if label is None:
+        return "SAFE"
+    await cache.aset(key, label)
+    return label
+
+def _safe_result() -> dict:
+    return {
+        "level": "safe",
+        "source": "keyword",
+        "crisis_matches": [],
+        "warning_matches": [],
+    }
+
+def keyword_verdict(scan: dict) -> str:
+    """Severity implied by keyword hits alone (used when the LLM is unavailable)."""
+    if scan["crisis_hits"]:
+        return "crisis"
+    if scan["warning_hits"]:
+        return "warning"
+    return "safe"
 
 def safety_check(text: str) -> dict:
     """Hybrid safety detection: keyword scan → LLM contextual classification."""
@@ -161,12 +406,7 @@ def safety_check(text: str) -> dict:
 
     # No risky keywords → SAFE immediately
     if not scan["crisis_hits"] and not scan["warning_hits"]:
-        return {
-            "level": "safe",
-            "source": "keyword",
-            "crisis_matches": [],
-            "warning_matches": [],
-        }
+        return _safe_result()
 
     # Keywords detected → LLM decides final severity
     llm_result = llm_classify(text).lower()
@@ -176,4 +416,38 @@ def safety_check(text: str) -> dict:
         "source": "llm",
         "crisis_matches": scan["crisis_hits"],
         "warning_matches": scan["warning_hits"],
+    }
+
+async def safety_check_async(text: str, timeout: Optional[float] = None) -> dict:
+    """
+    Non-blocking safety_check for the async API path.
+    If the LLM does not answer within `timeout` seconds (or fails),
+    fall back to the keyword verdict so a crisis hit is never downgraded.
+    """
+    if timeout is None:
+        timeout = SAFETY_LLM_TIMEOUT
+
+    scan = keyword_match(text)
+
+    # No risky keywords → SAFE immediately
+    if not scan["crisis_hits"] and not scan["warning_hits"]:
+        return _safe_result()
+
+    try:
+        level = (await asyncio.wait_for(llm_classify_async(text), timeout=timeout)).lower()
+        source = "llm"
+    except asyncio.TimeoutError:
+        print(f"Safety LLM timed out after {timeout}s, using keyword verdict")
+        level = keyword_verdict(scan)
+        source = "keyword_fallback"
+    except Exception as e:
+        print("Safety LLM failed, using keyword verdict:", e)
+        level = keyword_verdict(scan)
+        source = "keyword_fallback"
+
+    return {
+        "level": level,
+        "source": source,
+        "crisis_matches": scan["crisis_hits"],
+        "warning_matches": scan["warning_hits"],
     }
\ No newline at end of file
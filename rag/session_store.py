@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+# Per-session overhead of an empty Memory (shared agent), as traced by
+# benchmarks/bench_sessions.py (~3 KiB). Used only for the memory
+# estimate reported by stats(); history text is counted separately.
+SESSION_OVERHEAD_BYTES = 3 * 1024
+
+
+@dataclass
+class SessionEntry:
+    """Objects kept in memory for one chat session"""
+    memory: Any
+    last_access: float = field(default_factory=time.time)
+    history_bytes: int = 0  # Approximate size of the chat history text
+    persisted_count: Optional[int] = None  # Messages synced with the history backend (None = not loaded)
+
+
+class SessionStore:
+    """
+    Bounded session cache with LRU eviction and idle TTL.
+    Evicted sessions are only dropped from RAM; their history is persisted
+    after every turn, so they are recreated transparently on next access.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        idle_ttl: float,
+        on_evict: Optional[Callable[[str, SessionEntry], None]] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._entries: OrderedDict[str, SessionEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        """Return the entry and mark it as recently used."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry.last_access = time.time()
+                self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id: str, entry: SessionEntry):
+        """Insert an entry, evicting least recently used sessions beyond the cap."""
+        evicted = []
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                evicted.append(self._entries.popitem(last=False))
+        self._notify(evicted)
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._entries.pop(session_id, None) is not None
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+        return count
+
+    def session_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def evict_idle(self) -> int:
+        """Drop sessions not used for longer than idle_ttl."""
+        cutoff = time.time() - self.idle_ttl
+        evicted = []
+        with self._lock:
+            # Entries are in LRU order, so stop at the first fresh one
+            while self._entries:
+                session_id, entry = next(iter(self._entries.items()))
+                if entry.last_access > cutoff:
+                    break
+                evicted.append(self._entries.popitem(last=False))
+        self._notify(evicted)
+        return len(evicted)
+
+    def _notify(self, evicted: list[tuple[str, SessionEntry]]):
+        self.evictions += len(evicted)
+        for session_id, entry in evicted:
+            print(f"Session evicted from memory: {session_id}")
+            if self.on_evict is not None:
+                self.on_evict(session_id, entry)
+
+    def start_sweeper(self, interval: float):
+        """Start a daemon thread that evicts idle sessions every `interval` seconds."""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        self._stop.clear()
+
+        def sweep():
+            while not self._stop.wait(interval):
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    print("Session sweeper failed:", e)
+
+        self._sweeper = threading.Thread(target=sweep, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            history_bytes = sum(e.history_bytes for e in self._entries.values())
+            size = len(self._entries)
+        return {
+            "sessions": size,
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions": self.evictions,
+            "estimated_bytes": size * SESSION_OVERHEAD_BYTES + history_bytes,
+        }
@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+
+class VerdictStore(Protocol):
+    """Persistent backend for VerdictCache"""
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        ...
+
+    def set(self, key: str, verdict: str, created_at: float) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+
+class SQLiteVerdictStore:
+    """
+    On-disk verdict store so cached verdicts survive restarts.
+    Expired rows (older than `ttl`) and rows beyond `max_rows` (oldest
+    first) are deleted on open and every `prune_every` writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = None,
+        max_rows: Optional[int] = None,
+        prune_every: int = 256,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY,"
+            " verdict TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_created_at ON verdicts (created_at)")
+        self._conn.commit()
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete expired and surplus rows, return how many were removed"""
+        with self._lock:
+            removed = 0
+            if self.ttl is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+            if self.max_rows is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM verdicts WHERE key IN ("
+                    " SELECT key FROM verdicts ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict, created_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, verdict: str, created_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created_at) VALUES (?, ?, ?)",
+                (key, verdict, created_at),
+            )
+            self._conn.commit()
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM verdicts")
+            self._conn.commit()
+
+
+class VerdictCache:
+    """
+    Bounded LRU + TTL cache of safety verdicts.
+    Keys combine a prompt/model fingerprint with the normalized message,
+    so changing SAFETY_PROMPT or the LLM never reuses old verdicts.
+    """
+
+    VERDICTS = ("CRISIS", "WARNING", "SAFE")
+
+    def __init__(self, max_size: int, ttl: float, store: Optional[VerdictStore] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = store
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+
+    @staticmethod
+    def make_key(fingerprint: str, text_norm: str) -> str:
+        digest = hashlib.sha256(text_norm.encode("utf-8")).hexdigest()
+        return f"{fingerprint}:{digest}"
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                with self._lock:
+                    self._put(key, entry)
+                    self.hits += 1
+                    self.store_hits += 1
+                return entry[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, verdict: str):
+        if verdict not in self.VERDICTS:
+            return
+        entry = (verdict, time.time())
+        with self._lock:
+            self._put(key, entry)
+        if self.store is not None:
+            self.store.set(key, *entry)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for async callers: a store lookup runs in a worker thread"""
+        with self._lock:
+            entry = self._entries.get(key)
+            in_memory = entry is not None and not self._expired(entry[1])
+        if in_memory or self.store is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, verdict: str):
+        """set() for async callers: the store write runs in a worker thread"""
+        if self.store is None:
+            self.set(key, verdict)
+        else:
+            await asyncio.to_thread(self.set, key, verdict)
+
+    def _put(self, key: str, entry: tuple[str, float]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.store_hits = 0
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "store_hits": self.store_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persistent": self.store is not None,
+            }
@@ -0,0 +1,126 @@
+import os
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+_SYLLABLE_RE = re.compile(r"\w+")
+
+# Multi-syllable words of the DSM-5 domain (and common words around them).
+# Segmentation is greedy longest-match, so only whole words belong here,
+# not phrases ("rối loạn" and "trầm cảm", not "rối loạn trầm cảm").
+VI_LEXICON = (
+    "rối loạn", "trầm cảm", "lo âu", "hoảng sợ", "tâm thần", "phân liệt", "lưỡng cực",
+    "hưng cảm", "khí sắc", "cảm xúc", "ám ảnh", "cưỡng chế", "sang chấn", "căng thẳng",
+    "tự sát", "tự tử", "tự hại", "ý tưởng", "ý định", "hành vi", "triệu chứng", "chẩn đoán",
+    "tiêu chuẩn", "phân biệt", "nhân cách", "ranh giới", "chống đối", "xã hội", "tăng động",
+    "giảm chú ý", "chú ý", "tập trung", "trí nhớ", "nhận thức", "sa sút", "trí tuệ", "phát triển",
+    "tự kỷ", "giấc ngủ", "mất ngủ", "ngủ nhiều", "ăn uống", "chán ăn", "ăn vô độ", "thèm ăn",
+    "cân nặng", "năng lượng", "mệt mỏi", "hứng thú", "mất hứng thú", "vô giá trị", "tội lỗi",
+    "cái chết", "kích động", "chậm chạp", "vận động", "ảo giác", "hoang tưởng", "suy nghĩ",
+    "lời nói", "thanh thiếu niên", "vị thành niên", "trẻ em", "người lớn", "gia đình",
+    "điều chỉnh", "thích ứng", "chức năng", "suy giảm", "đáng kể", "lâm sàng", "kéo dài",
+    "giai đoạn", "ít nhất", "hầu hết", "chủ yếu", "mỗi ngày", "liên tục", "dai dẳng", "tái diễn",
+    "sau sinh", "thai kỳ", "tiền kinh nguyệt", "kinh nguyệt", "lạm dụng", "chất gây nghiện",
+    "cai nghiện", "ngộ độc", "bệnh lý", "y khoa", "sinh lý", "cơ thể",
+    "dạng cơ thể", "phân ly", "nhân dạng", "giải thể nhân cách", "tri giác", "bệnh nhân",
+    "người bệnh", "điều trị", "nguy cơ", "yếu tố", "tiên lượng", "khởi phát", "tỉ lệ", "tỷ lệ",
+    "mức độ", "trung bình", "thuyên giảm", "ngoại trừ",
+)
+
+# Function words that carry no meaning for lexical retrieval.
+# Negation ("không", "chưa") is kept on purpose: diagnostic criteria depend on it.
+VI_STOPWORDS = frozenset((
+    "và", "của", "là", "có", "các", "những", "được", "bị", "trong", "cho", "với", "một",
+    "này", "đó", "kia", "khi", "thì", "mà", "như", "để", "từ", "theo", "về", "do", "tại",
+    "hoặc", "hay", "nhưng", "cũng", "đã", "đang", "sẽ", "rằng", "nếu", "vì", "nên", "lại",
+    "ra", "vào", "trên", "dưới", "còn", "rất", "nhiều", "ở", "đến", "tới", "qua", "bởi",
+    "thể", "việc", "sự", "cái", "con", "người", "ai", "gì", "nào", "đây", "ấy", "vậy",
+))
+
+
+def fold_diacritics(text: str) -> str:
+    """Strip Vietnamese diacritics: "rối loạn" → "roi loan", "đ" → "d"."""
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", text).replace("đ", "d").replace("Đ", "D")
+
+
+def load_lexicon_file(path: Optional[str]) -> list[str]:
+    """Extra lexicon entries, one word per line (syllables separated by spaces)"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+class VietnameseAnalyzer:
+    """
+    BM25 analyzer for Vietnamese text.
+    - syllables are joined into words by greedy longest-match against a
+      lexicon ("rối loạn" → "rối_loạn"); the syllables of a compound are
+      emitted too, so partial matches still score and whole words rank higher
+    - stopwords are dropped
+    - optional "folded" field: the same segmentation on diacritic-free
+      text, so queries typed without accents still match
+    """
+
+    name = "vi"
+
+    def __init__(
+        self,
+        lexicon: Iterable[str] = VI_LEXICON,
+        stopwords: Iterable[str] = VI_STOPWORDS,
+        fold: bool = True,
+    ):
+        self.lexicon = sorted({unicodedata.normalize("NFC", w).lower().strip() for w in lexicon})
+        self.stopwords = frozenset(stopwords)
+        self.fold = fold
+        self.fields = ("text", "folded") if fold else ("text",)
+
+        self._words = {tuple(w.split()) for w in self.lexicon}
+        self._folded_words = {tuple(fold_diacritics(w).split()) for w in self.lexicon}
+        self._folded_stopwords = frozenset(fold_diacritics(w) for w in self.stopwords)
+        self._max_len = max((len(w) for w in self._words), default=1)
+
+    def _segment(self, syllables: list[str], words: set[tuple[str, ...]]) -> list[tuple[str, ...]]:
+        result = []
+        i = 0
+        while i < len(syllables):
+            for size in range(min(self._max_len, len(syllables) - i), 0, -1):
+                candidate = tuple(syllables[i:i + size])
+                if size == 1 or candidate in words:
+                    result.append(candidate)
+                    i += size
+                    break
+        return result
+
+    @staticmethod
+    def _tokens(words: list[tuple[str, ...]], stopwords: frozenset) -> list[str]:
+        tokens = []
+        for word in words:
+            if len(word) > 1:
+                # Compounds are always kept ("cơ thể" even though "thể" is a stopword)
+                tokens.append("_".join(word))
+            tokens.extend(s for s in word if len(s) > 1 and s not in stopwords)
+        return tokens
+
+    def analyze(self, text: str) -> dict[str, list[str]]:
+        syllables = _SYLLABLE_RE.findall(unicodedata.normalize("NFC", text).lower())
+        fields = {"text": self._tokens(self._segment(syllables, self._words), self.stopwords)}
+
+        if self.fold:
+            folded = self._segment([fold_diacritics(s) for s in syllables], self._folded_words)
+            fields["folded"] = self._tokens(folded, self._folded_stopwords)
+        return fields
+
+    def config(self) -> dict:
+        return {
+            "name": self.name,
+            "lexicon": self.lexicon,
+            "stopwords": sorted(self.stopwords),
+            "fold": self.fold,
+        }
+
+    @classmethod
+    def from_config(cls, config: dict) -> "VietnameseAnalyzer":
+        return cls(lexicon=config["lexicon"], stopwords=config["stopwords"], fold=config["fold"])
@@ -0,0 +1,143 @@
+import time
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class ComponentStatus:
+    """Load state of one preloaded component"""
+    name: str
+    state: str = "pending"  # pending → loading → ready | failed
+    started_at: Optional[float] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "duration_ms": round(self.duration_ms, 1) if self.duration_ms is not None else None,
+            "error": self.error,
+        }
+
+
+# Heavy modules are imported here, in the warm-up thread, never by api.main.
+# They are imported one after another first: importing overlapping packages
+# (transformers, llama_index) from several threads at once can deadlock.
+PRELOAD_MODULES = (
+    "rag.agent_core",
+    "rag.safety",
+    "rag.hybrid_retriever",
+    "llama_index.llms.groq",
+    "chromadb",
+    "llama_index.vector_stores.chroma",
+    "llama_index.embeddings.huggingface",
+    "sentence_transformers",
+)
+
+# Independent components load in parallel; the hybrid retriever only
+# assembles them, so it runs once they are done ("module:function")
+COMPONENTS: dict[str, str] = {
+    "llm": "rag.global_settings:init_llm_settings",
+    "embedding_model": "rag.index_builder:get_embed_model",
+    "chroma": "rag.index_builder:get_chroma_collection",
+    "bm25": "rag.hybrid_retriever:get_bm25_retriever",
+    "reranker": "rag.hybrid_retriever:get_reranker",
+}
+DEPENDENT_COMPONENTS: dict[str, str] = {
+    "hybrid_retriever": "rag.hybrid_retriever:get_hybrid_retriever",
+}
+
+_status: dict[str, ComponentStatus] = {
+    name: ComponentStatus(name) for name in ("imports", *COMPONENTS, *DEPENDENT_COMPONENTS)
+}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def _call(target: str) -> Callable[[], object]:
+    def loader():
+        module, attr = target.split(":")
+        return getattr(importlib.import_module(module), attr)()
+    return loader
+
+
+def _import_modules():
+    # A missing optional package only fails the components that need it
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"Warm-up: could not import {module}:", e)
+
+
+def _load(name: str, loader: Callable[[], object]) -> bool:
+    status = _status[name]
+    with _lock:
+        status.state = "loading"
+        status.started_at = time.perf_counter()
+
+    try:
+        loader()
+    except Exception as e:
+        with _lock:
+            status.state = "failed"
+            status.error = f"{type(e).__name__}: {e}"
+            status.duration_ms = (time.perf_counter() - status.started_at) * 1000
+        print(f"Warm-up: {name} failed:", e)
+        return False
+
+    with _lock:
+        status.state = "ready"
+        status.duration_ms = (time.perf_counter() - status.started_at) * 1000
+    print(f"Warm-up: {name} ready in {status.duration_ms:.0f} ms")
+    return True
+
+
+def warm_up(max_workers: Optional[int] = None) -> dict:
+    """Load every component (independent ones in parallel threads); returns readiness()"""
+    start = time.perf_counter()
+
+    _load("imports", _import_modules)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(COMPONENTS), thread_name_prefix="warmup") as pool:
+        results = list(pool.map(lambda item: _load(item[0], _call(item[1])), COMPONENTS.items()))
+
+    for name, target in DEPENDENT_COMPONENTS.items():
+        if all(results):
+            _load(name, _call(target))
+        else:
+            with _lock:
+                _status[name].state = "failed"
+                _status[name].error = "dependency failed"
+
+    print(f"Warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return readiness()
+
+
+def start_warm_up(max_workers: Optional[int] = None) -> threading.Thread:
+    """Run warm_up() in a background thread (once) so the server can accept probes meanwhile"""
+    global _thread
+
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warm_up, args=(max_workers,), name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def readiness() -> dict:
+    """Per-component load state and duration; ready once every component is"""
+    with _lock:
+        components = {name: status.to_dict() for name, status in _status.items()}
+        now = time.perf_counter()
+        for name, status in _status.items():
+            if status.state == "loading":
+                components[name]["duration_ms"] = round((now - status.started_at) * 1000, 1)
+
+    return {
+        "ready": all(c["state"] == "ready" for c in components.values()),
+        "components": components,
+    }
@@ -1,25 +1,72 @@
+import argparse
 from rag.ingest_pipeline import ingest_documents
-from rag.index_builder import build_index
+from rag.ingest_cache import SQLiteIngestCache
+from rag.embedding_cache import TextEmbeddingMemo
+from rag.global_settings import (
+    DOCS_DIR,
+    INGEST_WORKERS,
+    INGEST_CACHE_DB,
+    INGEST_CACHE_MAX_AGE_DAYS,
+    EMBEDDING_MODEL_NAME,
+)
+
+def compact_cache():
+    cache = SQLiteIngestCache(INGEST_CACHE_DB, namespace=EMBEDDING_MODEL_NAME)
+    report = cache.compact(INGEST_CACHE_MAX_AGE_DAYS)
+    cache.close()
+    print(f"- Cache compacted: {report['deleted']['nodes']} shards and {report['deleted']['embeddings']} "
+          f"embeddings unused for {INGEST_CACHE_MAX_AGE_DAYS} days removed, "
+          f"{report['size_before'] / 1e6:.1f} MB → {report['size_after'] / 1e6:.1f} MB")
 
 def main():
-    print("\n[1/2] Ingesting documents...")
-    nodes = ingest_documents()
-    
-    if not nodes:
+    parser = argparse.ArgumentParser(description="Ingest the documents under DOCS_DIR (incremental)")
+    parser.add_argument("--full", action="store_true", help="re-ingest every document and rebuild the indexes")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="processes splitting and embedding documents in parallel")
+    parser.add_argument("--compact-cache", action="store_true",
+                        help=f"drop ingest cache entries unused for {INGEST_CACHE_MAX_AGE_DAYS} days")
+    parser.add_argument("--compact-only", action="store_true",
+                        help="only compact the ingest cache (see --compact-cache), without ingesting")
+    args = parser.parse_args()
+
+    if args.compact_only:
+        compact_cache()
+        return
+
+    # One memo for the whole run: texts are embedded once across stages
+    memo = TextEmbeddingMemo()
+
+    print(f"\nIngesting documents from {DOCS_DIR}...")
+    result = ingest_documents(memo, full=args.full, workers=args.workers)
+
+    if not result.total_nodes:
         print("ERROR: No nodes created!")
+        if args.compact_cache:
+            compact_cache()
         return
-    
-    print(f" Created {len(nodes)} nodes")
-    
-    print("\n[2/2] Building ChromaDB index...")
-    build_index(nodes)
-    
+
     print("\nINGEST COMPLETED SUCCESSFULLY!")
     print("=" * 50)
-    print(f"- Nodes: {len(nodes)}")
+    print(f"- Documents: {len(result.added)} added, {len(result.changed)} changed, "
+          f"{len(result.removed)} removed, {len(result.unchanged)} unchanged")
+    print(f"- Nodes: {result.total_nodes} ({result.upserted_nodes} upserted, {result.deleted_nodes} deleted)")
     print(f"- ChromaDB: data/chroma/")
-    print(f"- BM25 Pickle: data/nodes/nodes.pkl")
-    print(f"- Pipeline Cache: data/cache/pipeline_cache.json")
+    print(f"- BM25 Index: data/bm25/")
+    print(f"- Manifest: data/ingest_manifest.json")
+    if result.cache_stats:
+        stats = result.cache_stats
+        print(f"- Ingest Cache: {stats['path']} ({stats['size_bytes'] / 1e6:.1f} MB)")
+        for table, counts in stats["tables"].items():
+            print(f"    {table}: {counts['entries']} entries, hit rate {counts['hit_rate']:.1%} "
+                  f"({counts['hits']} hits, {counts['misses']} misses, {counts['writes']} written)")
+    if args.compact_cache:
+        compact_cache()
+
+    report = memo.report()
+    print(f"- Embeddings computed: {report['total_computed']}")
+    for stage, counts in report["stages"].items():
+        print(f"    {stage}: {counts['computed']} computed, {counts['reused']} reused, "
+              f"{counts['precomputed']} precomputed (of {counts['requested']} requested)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()